@@ -1,12 +1,26 @@
-import os, sqlite3, json, joblib, datetime
-from flask import Flask, render_template, request, flash, Response, send_from_directory, redirect, url_for, jsonify
-import pandas as pd
-import matplotlib.pyplot as plt
+import os, io, csv, zlib, time, sqlite3, datetime, warnings, importlib
+BOOT_STARTED = time.perf_counter()
+from flask import Flask, render_template, request, flash, Response, send_from_directory, redirect, url_for, jsonify, g
+# In compiled mode pandas is imported on first use; preload() imports it up front for prefork
+# servers so workers share it. Pipeline mode loads the sklearn model (which imports pandas)
+# when the ModelStore below is created, so nothing is deferred there.
+from feature_encoder import ModelStore
+from compiled_forest import load_compiled
+import rollups
+import db
+import star_schema
+from write_behind import WriteBehindQueue, PREDICTION_INSERT_SQL
+from chart_service import ChartService
+import metrics
+import migrations
+import result_cache
 
 BASE = os.path.dirname(__file__)
 DB = os.path.join(BASE, 'supermart.db')
 MODEL = os.path.join(BASE, 'model_supermart.pkl')
+COMPILED_MODEL = os.path.join(BASE, 'model_supermart_compiled.npz')
 FEATURES = os.path.join(BASE, 'feature_columns.json')
+MODELS = os.path.join(BASE, 'models')
 OUTPUTS = os.path.join(BASE, 'outputs')
 STATIC_CHARTS = os.path.join(BASE, 'static', 'charts')
 
@@ -16,86 +30,86 @@ os.makedirs(STATIC_CHARTS, exist_ok=True)
 app = Flask(__name__)
 app.secret_key = "supermart_secret_v3"
 
+# 'pipeline' (joblib sklearn Pipeline) or 'compiled' (NumPy forest exported by model_build.py)
+INFERENCE_MODE = os.environ.get('SUPERMART_INFERENCE', 'pipeline')
+
+# Long-lived WAL connections shared by all routes (see db.py for the pragmas)
+pool = db.ConnectionPool(DB)
+
+# ------------------------------
+# Schema migrations (predictions table, star schema / rollup / indexes for older DBs)
 # ------------------------------
-# Ensure predictions table exists
-# ------------------------------
-def ensure_predictions_table():
-    conn = sqlite3.connect(DB)
-    # Create table if not exists
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS predictions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        product TEXT,
-        store_location TEXT,
-        date TEXT,
-        year INTEGER,
-        quantity REAL,
-        unit_price REAL,
-        predicted_total REAL
-    );
-    """)
-
-    # ✅ Try to add 'year' column if it doesn’t exist already
+# One-time steps tracked in PRAGMA user_version; a current DB costs one pragma read
+with pool.connection() as conn:
     try:
-        conn.execute("ALTER TABLE predictions ADD COLUMN year INTEGER;")
-    except sqlite3.OperationalError:
-        # column already exists — ignore the error
-        pass
+        migrations.migrate(conn, DB)
+    except sqlite3.Error as e:
+        print("Schema migration failed:", e)
 
-    conn.commit()
-    conn.close()
+# Trend charts render in a separate process, from the monthly rollup, off the request path.
+# Created before the model and background threads so the forked worker stays small. Prefork
+# servers that preload the app set SUPERMART_CHARTS_START=0 and start each worker's pool
+# right after the fork instead (gunicorn.conf.py post_fork); one in the master goes unused.
+charts = ChartService(pool, OUTPUTS, start=os.environ.get('SUPERMART_CHARTS_START', '1') != '0')
 
+# /predict only enqueues; rows are written in batches by a background thread
+prediction_log = WriteBehindQueue(pool, PREDICTION_INSERT_SQL)
+
+# ------------------------------
+# Result caches (see result_cache.py for the SUPERMART_CACHE* settings)
+# ------------------------------
+# Repeated /predict inputs skip the model and repeated /filter_data filters skip SQL. Entries
+# carry the model stamp / supermart_raw version they were computed against and miss once
+# either changes; the data version is re-read at most every CHECK_SECONDS.
+EXPLORER_CACHE_SIZE = 128   # entries hold up to 2000 rows of JSON each
 
-ensure_predictions_table()
+shared_cache = result_cache.SharedTier(result_cache.SHARED_PATH) if result_cache.SHARED_PATH else None
+prediction_cache = result_cache.ResultCache('predict', shared=shared_cache)
+explorer_cache = result_cache.ResultCache('filter_data', maxsize=min(result_cache.MAX_SIZE, EXPLORER_CACHE_SIZE),
+                                          shared=shared_cache)
+
+def _read_raw_version():
+    with pool.connection() as conn:
+        return (db.file_id(DB),) + db.raw_version(conn)
+
+raw_version = result_cache.VersionProbe(_read_raw_version)
 
 # ------------------------------
 # Load Model
 # ------------------------------
-def load_model():
-    if os.path.exists(MODEL):
+# The pipeline was fitted on a DataFrame; the encoder feeds it NumPy arrays in the
+# same column order (ModelStore checks this on load), so the name check is noise.
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+def load_model(path=MODEL):
+    if os.path.exists(path):
         try:
-            return joblib.load(MODEL)
+            import joblib
+            return joblib.load(path)
         except Exception as e:
             print("Model load failed:", e)
     return None
 
-model = load_model()
+# Serves the current version from models/registry.json (falling back to model_supermart.pkl
+# and feature_columns.json) and reloads model + columns together when either changes
+if INFERENCE_MODE == 'compiled' and os.path.exists(COMPILED_MODEL):
+    # a version published without a compiled export is served by its own pipeline
+    models = ModelStore(COMPILED_MODEL, FEATURES, load_compiled, registry=MODELS, artifact='compiled',
+                        fallback=('model', load_model))
+else:
+    models = ModelStore(MODEL, FEATURES, load_model, registry=MODELS)
 
 # ------------------------------
-# Build Feature Vector
+# Build Feature Matrix (batch)
 # ------------------------------
-def get_feature_vector(form):
-    cols = []
-    if os.path.exists(FEATURES):
-        try:
-            with open(FEATURES,'r') as f:
-                cols = json.load(f)
-        except:
-            cols = []
-    row = dict.fromkeys(cols, 0.0)
-    product = form.get('product') or ''
-    store_location = form.get('store_location') or ''
-    date = form.get('date') or ''
-    try:
-        year = pd.to_datetime(date).year
-        month = pd.to_datetime(date).month
-    except:
-        year = 0; month = 0
-
-    if 'year' in row: row['year'] = year
-    if 'month' in row: row['month'] = month
-    if 'quantity' in row: row['quantity'] = float(form.get('quantity') or 0)
-    if 'unit_price' in row: row['unit_price'] = float(form.get('unit_price') or 0)
+MAX_BATCH_ROWS = 100000
 
-    # Dummies
-    prod_key = 'product_top_' + product
-    if prod_key in row: row[prod_key] = 1.0
-    store_key = 'store_location_top_' + store_location
-    if store_key in row: row[store_key] = 1.0
+def get_feature_matrix(records, encoder=None):
+    """Vectorized counterpart of FeatureEncoder.encode_one for a list of input dicts.
 
-    X = pd.DataFrame([row], columns=cols).fillna(0.0) if cols else pd.DataFrame([[year, month, form.get('quantity'), form.get('unit_price')]], columns=['year','month','quantity','unit_price'])
-    return X, (product, store_location, date, year)
+    Returns (X, rows) where rows are (product, store_location, date, year, month, quantity, unit_price).
+    """
+    return (encoder or models.encoder).encode_many(records)
 
 # ------------------------------
 # Home Page
@@ -109,13 +123,33 @@ def index():
                 charts.append('charts/' + fname)
     total_rows = 0
     if os.path.exists(DB):
-        conn = sqlite3.connect(DB)
+        with pool.connection() as conn:
+            try:
+                table = 'supermart_raw' if db.raw_is_plain(conn) else 'fact_sales'
+                total_rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            except:
+                total_rows = 0
+    return render_template('index.html', charts=charts, total=total_rows, model_loaded=(models.model is not None))
+
+# ------------------------------
+# Dropdown data (dimension tables, cached)
+# ------------------------------
+_dropdowns = {"version": None, "values": ([], [])}
+
+def dropdown_values():
+    """Store and product lists from the dimension tables, re-read only when they grow."""
+    if not os.path.exists(DB):
+        return [], []
+    with pool.connection() as conn:
         try:
-            total_rows = conn.execute("SELECT COUNT(*) FROM supermart_raw").fetchone()[0]
-        except:
-            total_rows = 0
-        conn.close()
-    return render_template('index.html', charts=charts, total=total_rows, model_loaded=(model is not None))
+            version = (db.file_id(DB), db.data_version(conn), star_schema.dimension_version(conn))
+            if version != _dropdowns["version"]:
+                stores, products = star_schema.dimension_values(conn)
+                _dropdowns["values"] = (stores[:200], products[:200])
+                _dropdowns["version"] = version
+        except Exception:
+            return [], []
+    return _dropdowns["values"]
 
 # ------------------------------
 # Predict Page
@@ -124,30 +158,33 @@ def index():
 def predict():
     prediction = None; saved=False
     if request.method == 'POST':
-        X, meta = get_feature_vector(request.form)
-        product, store_location, date, year = meta
-        qty = float(request.form.get('quantity') or 0)
-        up = float(request.form.get('unit_price') or 0)
+        with metrics.stage('predict', 'features'):
+            model, encoder, stamp = models.versioned()
+            X, parsed = encoder.encode_one(request.form)
+        product, store_location, date, year, _, qty, up = parsed
         if model is None:
             flash("Model not available. Run model_build.py to create model_supermart.pkl", "error")
             return redirect(url_for('predict'))
         try:
-            pred = model.predict(X)[0]
-            prediction = round(float(pred), 2)
+            def run_model():
+                with metrics.stage('predict', 'model'):
+                    return float(model.predict(X)[0])
+            # the encoded row is the key: inputs that differ only in the day of month share it
+            prediction = round(prediction_cache.get_or_compute(X.tobytes().hex(), stamp, run_model), 2)
         except Exception as e:
             flash("Prediction failed: "+str(e), "error")
             return redirect(url_for('predict'))
         # Save prediction
         try:
-            conn = sqlite3.connect(DB)
-            conn.execute("""
-                INSERT INTO predictions (timestamp, product, store_location, date, year, quantity, unit_price, predicted_total)
-                VALUES (?,?,?,?,?,?,?,?)
-            """, (datetime.datetime.utcnow().isoformat(), product, store_location, date, year, qty, up, prediction))
-            conn.commit(); conn.close()
-            flash("✅ Prediction saved successfully.", "success")
+            row = (datetime.datetime.utcnow().isoformat(), product, store_location, date, year, qty, up, prediction)
+            with metrics.stage('predict', 'insert'):
+                queued = prediction_log.put(row)
+            if not queued:
+                raise RuntimeError("prediction log is full, try again shortly")
+            flash("✅ Prediction queued for saving.", "success")
             try:
-                generate_and_save_charts(product if product else store_location)
+                with metrics.stage('predict', 'charts'):
+                    generate_and_save_charts(product if product else store_location)
             except Exception as e:
                 print("Chart generation error:", e)
             return redirect(url_for('predictions'))
@@ -155,30 +192,101 @@ def predict():
             flash("Saving failed: "+str(e), "error")
             return redirect(url_for('predict'))
 
-    # Dropdown data
-    stores=[]; products=[]
-    if os.path.exists(DB):
-        conn = sqlite3.connect(DB)
+    with metrics.stage('predict', 'dropdowns'):
+        stores, products = dropdown_values()
+    return render_template('predict.html', prediction=prediction, stores=stores, products=products, model_loaded=(models.model is not None))
+
+# ------------------------------
+# Batch Prediction API
+# ------------------------------
+def read_batch_records(req):
+    """Accept a JSON list (or {"rows": [...]}), a CSV body or an uploaded CSV file."""
+    import pandas as pd
+    upload = req.files.get('file')
+    if upload is not None:
+        return pd.read_csv(upload).to_dict(orient='records')
+    if req.mimetype == 'text/csv':
+        return pd.read_csv(io.StringIO(req.get_data(as_text=True))).to_dict(orient='records')
+    data = req.get_json(force=True, silent=True)
+    if isinstance(data, dict):
+        data = data.get('rows')
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON list of rows, {\"rows\": [...]}, or a CSV body")
+    for i, rec in enumerate(data):
+        if not isinstance(rec, dict):
+            raise ValueError(f"Row {i} is not an object")
+    return data
+
+@app.route('/api/predict_batch', methods=['POST'])
+def predict_batch():
+    model, encoder = models.get()
+    if model is None:
+        return jsonify({"error": "Model not available. Run model_build.py to create model_supermart.pkl"}), 503
+    t0 = time.perf_counter()
+    try:
+        records = read_batch_records(request)
+    except Exception as e:
+        return jsonify({"error": "Could not parse batch: " + str(e)}), 400
+    if not records:
+        return jsonify({"error": "Empty batch"}), 400
+    if len(records) > MAX_BATCH_ROWS:
+        return jsonify({"error": f"Batch too large (max {MAX_BATCH_ROWS} rows)"}), 413
+    save = request.args.get('save', '1') not in ('0', 'false', 'no')
+
+    t1 = time.perf_counter()
+    X, parsed = get_feature_matrix(records, encoder)
+    t2 = time.perf_counter()
+    try:
+        preds = model.predict(X).round(2)
+    except Exception as e:
+        return jsonify({"error": "Prediction failed: " + str(e)}), 500
+    t3 = time.perf_counter()
+
+    if save:
+        ts = datetime.datetime.utcnow().isoformat()
+        rows = [(ts, p, s, d, y, q, u, pred) for (p, s, d, y, _, q, u), pred in zip(parsed, preds.tolist())]
         try:
-            stores = [r[0] for r in conn.execute("SELECT DISTINCT store_location FROM supermart_raw WHERE store_location IS NOT NULL LIMIT 200").fetchall()]
-            products = [r[0] for r in conn.execute("SELECT DISTINCT product FROM supermart_raw WHERE product IS NOT NULL LIMIT 200").fetchall()]
-        except Exception:
-            stores=[]; products=[]
-        conn.close()
-    return render_template('predict.html', prediction=prediction, stores=stores, products=products, model_loaded=(model is not None))
+            with pool.connection() as conn, conn:
+                conn.executemany(PREDICTION_INSERT_SQL, rows)
+        except Exception as e:
+            return jsonify({"error": "Saving failed: " + str(e)}), 500
+    t4 = time.perf_counter()
+
+    ms = lambda a, b: round((b - a) * 1000, 3)
+    return jsonify({
+        "count": len(preds),
+        "saved": save,
+        "predictions": preds.tolist(),
+        "timing_ms": {"parse": ms(t0, t1), "features": ms(t1, t2), "predict": ms(t2, t3),
+                      "insert": ms(t3, t4), "total": ms(t0, t4)},
+    })
+
+@app.route('/api/prediction_log')
+def prediction_log_stats():
+    return jsonify(prediction_log.stats())
+
+@app.route('/api/cache')
+def cache_stats():
+    return jsonify({"predict": prediction_cache.stats(), "filter_data": explorer_cache.stats()})
+
+@app.route('/api/model')
+def model_info():
+    models.get()
+    return jsonify({"version": models.version, "loads": models.loads, "mode": INFERENCE_MODE,
+                    "startup_seconds": round(STARTUP_SECONDS, 3)})
 
 # ------------------------------
 # Predictions Page
 # ------------------------------
 @app.route('/predictions')
 def predictions():
-    conn = sqlite3.connect(DB)
-    try:
-        df = pd.read_sql_query("SELECT * FROM predictions ORDER BY id DESC LIMIT 500;", conn)
-    except Exception as e:
-        print("SQL read failed:", e)
-        df = pd.DataFrame()
-    conn.close()
+    import pandas as pd
+    with pool.connection() as conn:
+        try:
+            df = pd.read_sql_query("SELECT * FROM predictions ORDER BY id DESC LIMIT 500;", conn)
+        except Exception as e:
+            print("SQL read failed:", e)
+            df = pd.DataFrame()
     records = df.to_dict(orient='records') if not df.empty else []
     chart_groups = {}
     if os.path.exists(OUTPUTS):
@@ -189,117 +297,171 @@ def predictions():
     return render_template('predictions.html', records=records, chart_groups=chart_groups)
 
 # ------------------------------
-# Download CSV
+# Download CSV (streamed)
 # ------------------------------
+EXPORT_BATCH_ROWS = 5000
+
+def predictions_export_filter(args):
+    """WHERE clause for the optional id_from/id_to and date_from/date_to export filters."""
+    where = ["1=1"]; params = []
+    for arg, cond, cast in [('id_from', 'id >= ?', int), ('id_to', 'id <= ?', int),
+                            ('date_from', 'date >= ?', str), ('date_to', 'date <= ?', str)]:
+        if args.get(arg):
+            where.append(cond); params.append(cast(args[arg]))
+    return " AND ".join(where), params
+
+def iter_predictions_csv(where_sql, params, compress=False):
+    """Yield the predictions table as CSV chunks, one fetchmany batch at a time."""
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    def emit():
+        data = buf.getvalue().encode('utf-8')
+        buf.seek(0); buf.truncate()
+        return gz.compress(data) if gz else data
+    with pool.connection() as conn:
+        cur = conn.execute(f"SELECT * FROM predictions WHERE {where_sql} ORDER BY id DESC;", params)
+        writer.writerow([d[0] for d in cur.description])
+        while True:
+            rows = cur.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                break
+            writer.writerows(rows)
+            chunk = emit()
+            if chunk:
+                yield chunk
+        cur.close()
+    tail = emit()
+    if gz:
+        tail += gz.flush()
+    if tail:
+        yield tail
+
 @app.route('/download_predictions')
 def download_predictions():
-    conn = sqlite3.connect(DB)
     try:
-        df = pd.read_sql_query("SELECT * FROM predictions ORDER BY id DESC;", conn)
-    except:
-        df = pd.DataFrame()
-    conn.close()
-    if df.empty:
+        where_sql, params = predictions_export_filter(request.args)
+    except ValueError:
+        flash("Invalid id filter.", "error")
+        return redirect(url_for('predictions'))
+    with pool.connection() as conn:
+        try:
+            has_rows = conn.execute(f"SELECT 1 FROM predictions WHERE {where_sql} LIMIT 1;", params).fetchone() is not None
+        except:
+            has_rows = False
+    if not has_rows:
         flash("No predictions to download.", "error")
         return redirect(url_for('predictions'))
-    csv = df.to_csv(index=False)
-    return Response(csv, mimetype='text/csv', headers={'Content-Disposition':'attachment; filename=supermart_predictions.csv'})
+    compress = request.args.get('gzip', '0') not in ('0', 'false', 'no', '')
+    filename = 'supermart_predictions.csv' + ('.gz' if compress else '')
+    headers = {'Content-Disposition': 'attachment; filename=' + filename}
+    return Response(iter_predictions_csv(where_sql, params, compress),
+                    mimetype='application/gzip' if compress else 'text/csv', headers=headers)
 
 # ------------------------------
 # SQL Explorer (Interactive)
 # ------------------------------
 @app.route('/sql')
 def sql_page():
-    conn = sqlite3.connect(DB)
-    try:
-        # 🏪 Top Stores by Total Sales
-        df1 = pd.read_sql_query("""
-            SELECT store_location AS Store, ROUND(SUM(total),2) AS Total_Sales
-            FROM supermart_raw
-            GROUP BY store_location
-            ORDER BY Total_Sales DESC LIMIT 20;
-        """, conn)
-    except Exception as e:
-        print("SQL df1 error:", e)
-        df1 = pd.DataFrame()
-
-    try:
-        # 📅 Monthly Sales Trend (latest year)
-        df2 = pd.read_sql_query("""
-            SELECT strftime('%Y', date) AS Year, strftime('%m', date) AS Month,
-                   ROUND(SUM(total),2) AS Total_Sales
-            FROM supermart_raw
-            GROUP BY Year, Month
-            ORDER BY Year DESC, Month ASC;
-        """, conn)
-    except Exception as e:
-        print("SQL df2 error:", e)
-        df2 = pd.DataFrame()
+    import pandas as pd
+    with pool.connection() as conn:
+        try:
+            # 🏪 Top Stores by Total Sales
+            with metrics.stage('sql', 'store_sales'):
+                df1 = pd.read_sql_query(rollups.STORE_SALES_SQL, conn)
+        except Exception as e:
+            print("SQL df1 error:", e)
+            df1 = pd.DataFrame()
 
-    try:
-        # 🧾 Top 15 Products by Total Sales
-        df3 = pd.read_sql_query("""
-            SELECT product AS Product, ROUND(SUM(total),2) AS Total_Sales, SUM(quantity) AS Total_Quantity
-            FROM supermart_raw
-            GROUP BY product
-            ORDER BY Total_Sales DESC LIMIT 15;
-        """, conn)
-    except Exception as e:
-        print("SQL df3 error:", e)
-        df3 = pd.DataFrame()
+        try:
+            # 📅 Monthly Sales Trend (latest year)
+            with metrics.stage('sql', 'monthly_sales'):
+                df2 = pd.read_sql_query(rollups.MONTHLY_SALES_SQL, conn)
+        except Exception as e:
+            print("SQL df2 error:", e)
+            df2 = pd.DataFrame()
 
-    try:
-        # 💰 Average Unit Price by Store
-        df4 = pd.read_sql_query("""
-            SELECT store_location AS Store, ROUND(AVG(unit_price),2) AS Avg_Unit_Price
-            FROM supermart_raw
-            GROUP BY store_location
-            ORDER BY Avg_Unit_Price DESC LIMIT 15;
-        """, conn)
-    except Exception as e:
-        print("SQL df4 error:", e)
-        df4 = pd.DataFrame()
+        try:
+            # 🧾 Top 15 Products by Total Sales
+            with metrics.stage('sql', 'top_products'):
+                df3 = pd.read_sql_query(rollups.TOP_PRODUCTS_SQL, conn)
+        except Exception as e:
+            print("SQL df3 error:", e)
+            df3 = pd.DataFrame()
 
+        try:
+            # 💰 Average Unit Price by Store
+            with metrics.stage('sql', 'store_unit_price'):
+                df4 = pd.read_sql_query(rollups.STORE_UNIT_PRICE_SQL, conn)
+        except Exception as e:
+            print("SQL df4 error:", e)
+            df4 = pd.DataFrame()
 
-    conn.close()
 
-    return render_template(
-        'sql.html',
-        df1=df1.to_dict(orient='records'),
-        df2=df2.to_dict(orient='records'),
-        df3=df3.to_dict(orient='records'),
-        df4=df4.to_dict(orient='records')
-    )
+    with metrics.stage('sql', 'render'):
+        return render_template(
+            'sql.html',
+            df1=df1.to_dict(orient='records'),
+            df2=df2.to_dict(orient='records'),
+            df3=df3.to_dict(orient='records'),
+            df4=df4.to_dict(orient='records')
+        )
     # return render_template('sql.html')
 
 @app.route('/filter_data', methods=['POST'])
 def filter_data():
+    import pandas as pd
     data = request.get_json(force=True)
-    year = data.get("year", "")
+    year = str(data.get("year", "")).strip()
     product = data.get("product", "")
     store = data.get("store", "")
-    conn = sqlite3.connect(DB)
-    where = ["1=1"]
-    params = []
-    if year:
-        where.append("strftime('%Y', date)=?")
-        params.append(year)
-    if product:
-        where.append("product=?")
-        params.append(product)
-    if store:
-        where.append("store_location=?")
-        params.append(store)
-    where_sql = " AND ".join(where)
     try:
-        df = pd.read_sql_query(f"SELECT * FROM supermart_raw WHERE {where_sql} LIMIT 2000;", conn, params=params)
-        table = df.fillna("").to_dict(orient="records")
-        kpi = pd.read_sql_query(f"SELECT SUM(total) as total_sales, SUM(quantity) as total_items, COUNT(*) as transactions, AVG(total) as avg_bill FROM supermart_raw WHERE {where_sql};", conn, params=params).iloc[0].to_dict()
-        return jsonify({"table": table, "kpis": kpi})
+        def query():
+            with pool.connection() as conn:
+                # year becomes a date range so the composite indexes can be used
+                where_sql, params = db.raw_where(conn, year, product, store)
+                with metrics.stage('filter_data', 'query'):
+                    df = pd.read_sql_query(db.raw_select_sql(conn, where_sql) + " LIMIT 2000;", conn, params=params)
+                with metrics.stage('filter_data', 'serialize'):
+                    table = df.fillna("").to_dict(orient="records")
+                with metrics.stage('filter_data', 'kpis'):
+                    kpi = rollups.kpis(conn, year, product, store)
+            return app.json.dumps({"table": table, "kpis": kpi})
+        # the cached value is the response body, so a hit also skips serialisation
+        body = explorer_cache.get_or_compute((year, product, store), raw_version(), query)
+        return Response(body, mimetype=app.json.mimetype)
     except Exception as e:
         return jsonify({"error": str(e)})
-    finally:
-        conn.close()
+
+# ------------------------------
+# Paginated JSON APIs (keyset, columnar)
+# ------------------------------
+@app.route('/api/predictions')
+def api_predictions():
+    try:
+        limit = db.page_size(request.args.get('limit'))
+        with pool.connection() as conn:
+            return jsonify(db.predictions_page(conn, request.args.get('cursor'), limit))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/filter_data', methods=['GET', 'POST'])
+def api_filter_data():
+    data = request.get_json(silent=True) or request.args
+    year = data.get("year", "")
+    product = data.get("product", "")
+    store = data.get("store", "")
+    cursor = data.get("cursor")
+    try:
+        limit = db.page_size(data.get("limit"))
+        with pool.connection() as conn:
+            where_sql, params = db.raw_where(conn, year, product, store)
+            page = db.raw_page(conn, where_sql, params, cursor, limit)
+            if not cursor:
+                page["kpis"] = rollups.kpis(conn, year, product, store)
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 # ------------------------------
 # Serve Output Charts
@@ -308,26 +470,92 @@ def filter_data():
 def outputs(filename):
     filename = filename.replace("\\","/")
     safe = os.path.basename(filename)
-    return send_from_directory(OUTPUTS, safe)
+    resp = send_from_directory(OUTPUTS, safe, conditional=True, max_age=0)
+    version = charts.version(safe)
+    if version and resp.status_code == 200:
+        resp.set_etag(version)
+        resp.make_conditional(request)
+    return resp
 
 # ------------------------------
 # Chart Generation
 # ------------------------------
 def generate_and_save_charts(key):
-    conn = sqlite3.connect(DB)
-    df_raw = pd.read_sql_query("SELECT * FROM supermart_raw", conn)
-    conn.close()
-
-    plt.figure(figsize=(8,4))
-    df_raw['date'] = pd.to_datetime(df_raw['date'], errors='coerce')
-    df_raw['month'] = df_raw['date'].dt.to_period('M')
-    agg = df_raw.groupby('month')['total'].sum()
-    agg.plot(marker='o')
-    plt.title(f"Monthly Sales Trend - {key}")
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUTS, f"{key}_trend.png"))
-    plt.close()
+    """Queue the monthly trend chart for `key`; returns a Future (None if already current)."""
+    with metrics.stage('charts', 'prepare'):
+        future = charts.render_trend(key)
+    if future is not None and metrics.REGISTRY.enabled:
+        # rendering finishes in the worker process; time it from submit to completion
+        start = time.perf_counter()
+        future.add_done_callback(lambda f: metrics.STAGE_SECONDS.observe(time.perf_counter() - start, 'charts', 'render'))
+    return future
+
+# ------------------------------
+# Metrics
+# ------------------------------
+if metrics.REGISTRY.enabled:
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(resp):
+        start = g.pop('request_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route, request.method, str(resp.status_code))
+        return resp
+
+    @metrics.REGISTRY.collector
+    def _component_counters():
+        wb = prediction_log.stats()
+        return [
+            ('supermart_model_loads_total', 'counter', 'Model (re)loads by the ModelStore.', models.loads),
+            ('supermart_chart_renders_total', 'counter', 'Charts rendered by the chart worker.', charts.renders),
+            ('supermart_chart_cache_hits_total', 'counter', 'Chart requests served by an up-to-date PNG.', charts.cache_hits),
+            ('supermart_chart_deduped_total', 'counter', 'Chart requests joined to an in-flight render.', charts.deduped),
+            ('supermart_prediction_log_flushed_total', 'counter', 'Predictions written by the write-behind queue.', wb['flushed']),
+            ('supermart_prediction_log_dropped_total', 'counter', 'Predictions dropped by the write-behind queue.', wb['dropped']),
+            ('supermart_prediction_log_pending', 'gauge', 'Predictions waiting to be written.', wb['pending']),
+            ('supermart_db_connections_opened_total', 'counter', 'SQLite connections opened by the pool.', pool.opened),
+            ('supermart_startup_seconds', 'gauge', 'Time to import and initialise app.py.', STARTUP_SECONDS),
+        ] + _cache_counters()
+
+    def _cache_counters():
+        out = []
+        for cache in (prediction_cache, explorer_cache):
+            stats = cache.stats()
+            prefix = f'supermart_{cache.name}_cache_'
+            out += [
+                (prefix + 'hits_total', 'counter', f'{cache.name} results served from this process.', stats['hits']),
+                (prefix + 'shared_hits_total', 'counter', f'{cache.name} results served from the shared tier.', stats['shared_hits']),
+                (prefix + 'misses_total', 'counter', f'{cache.name} lookups that had to compute.', stats['misses']),
+                (prefix + 'stale_total', 'counter', f'{cache.name} entries dropped after a version change.', stats['stale']),
+                (prefix + 'evictions_total', 'counter', f'{cache.name} entries evicted by the LRU limit.', stats['evictions']),
+                (prefix + 'entries', 'gauge', f'{cache.name} entries held by this process.', stats['size']),
+            ]
+        return out
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics.REGISTRY.enabled:
+        return Response("metrics disabled (SUPERMART_METRICS=0)\n", status=404, mimetype='text/plain')
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/slow_queries')
+def slow_queries():
+    return jsonify({"threshold_ms": metrics.SLOW_QUERY_MS, "queries": list(metrics.slow_queries)})
+
+# ------------------------------
+# Start-up
+# ------------------------------
+def preload():
+    """Import the lazily loaded libraries and load the model now. Prefork servers call this in
+    the master before forking (see gunicorn.conf.py) so workers share it copy-on-write."""
+    importlib.import_module('pandas')
+    models.get()
+
+STARTUP_SECONDS = time.perf_counter() - BOOT_STARTED
 
 if __name__ == "__main__":
     print("🚀 Starting Supermart Flask App")
@@ -0,0 +1,60 @@
+# bench_inference.py
+# Compare the stock sklearn pipeline with the compiled NumPy forest.
+# Run model_build.py first so both model_supermart.pkl and model_supermart_compiled.npz exist.
+import os, sys, time, json
+import numpy as np
+import pandas as pd
+import joblib
+from compiled_forest import load_compiled
+
+BASE = os.path.dirname(__file__)
+MODEL = os.path.join(BASE, 'model_supermart.pkl')
+COMPILED = os.path.join(BASE, 'model_supermart_compiled.npz')
+FEATURES = os.path.join(BASE, 'feature_columns.json')
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter(); fn(); samples.append((time.perf_counter() - t) * 1000)
+    samples = np.array(samples)
+    return {'p50_ms': round(float(np.percentile(samples, 50)), 3),
+            'p99_ms': round(float(np.percentile(samples, 99)), 3),
+            'mean_ms': round(float(samples.mean()), 3)}
+
+def sample_rows(cols, n, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n, len(cols)))
+    idx = {c: i for i, c in enumerate(cols)}
+    X[:, idx['year']] = rng.integers(2022, 2024, n)
+    X[:, idx['month']] = rng.integers(1, 13, n)
+    X[:, idx['quantity']] = rng.integers(1, 31, n)
+    X[:, idx['unit_price']] = rng.uniform(0.5, 10.0, n).round(2)
+    for prefix in ('product_top_', 'store_location_top_'):
+        dummies = [idx[c] for c in cols if c.startswith(prefix)]
+        pick = rng.integers(0, len(dummies) + 1, n)  # last slot = dropped baseline category
+        hit = pick < len(dummies)
+        X[np.arange(n)[hit], np.array(dummies)[pick[hit]]] = 1.0
+    return X
+
+def main(repeat=200):
+    if not (os.path.exists(MODEL) and os.path.exists(COMPILED)):
+        raise SystemExit("Run model_build.py first to create both model files.")
+    cols = json.load(open(FEATURES))
+    pipe = joblib.load(MODEL)
+    compiled = load_compiled(COMPILED)
+    one = sample_rows(cols, 1); batch = sample_rows(cols, 1000)
+    one_df = pd.DataFrame(one, columns=cols); batch_df = pd.DataFrame(batch, columns=cols)
+
+    diff = float(np.abs(compiled.predict(batch) - pipe.predict(batch_df)).max())
+    results = {
+        'max_abs_diff': diff,
+        'pipeline_1_row': timed(lambda: pipe.predict(one_df), repeat),
+        'compiled_1_row': timed(lambda: compiled.predict(one), repeat),
+        'pipeline_1k_rows': timed(lambda: pipe.predict(batch_df), max(repeat // 10, 5)),
+        'compiled_1k_rows': timed(lambda: compiled.predict(batch), max(repeat // 10, 5)),
+    }
+    print(json.dumps(results, indent=2))
+    return results
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,397 @@
+# bench_suite.py
+# End-to-end benchmarks on a synthetic dataset of configurable size.
+#
+#   python bench_suite.py [--stores 5 --products 11 --years 2 --rows-per-day N]
+#                         [--clients 4 --requests 100] [--url http://127.0.0.1:5000]
+#                         [--out bench_results.json] [--baseline old.json --threshold 0.25]
+#
+# Runs in a scratch copy of the project (--workdir, default a temp dir) so the real data,
+# models and database are untouched. Every stage runs in a fresh subprocess that reports
+# its wall time and peak RSS. Routes are driven through the Flask test client, or a live
+# server with --url, by concurrent client threads. Results are written as JSON; with
+# --baseline, p95 latency, throughput, stage time and peak RSS are compared and any metric
+# worse than the threshold is listed under "regressions" (exit status 1).
+import os, sys, json, time, glob, shutil, argparse, platform, tempfile, threading, subprocess, resource
+import urllib.request, urllib.parse, urllib.error
+import numpy as np
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+RESULT_PREFIX = 'BENCH_RESULT '
+ROUTES = ['index', 'predict_get', 'predict_post', 'predictions', 'sql', 'filter_data', 'download_predictions']
+
+# ------------------------------
+# Measurement helpers
+# ------------------------------
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)   # ru_maxrss is KiB on Linux
+
+def latency_stats(samples_ms, wall_s=None):
+    a = np.asarray(samples_ms, dtype=float)
+    if not len(a):
+        return {'count': 0}
+    out = {'count': int(len(a)),
+           'p50_ms': round(float(np.percentile(a, 50)), 3),
+           'p95_ms': round(float(np.percentile(a, 95)), 3),
+           'p99_ms': round(float(np.percentile(a, 99)), 3),
+           'mean_ms': round(float(a.mean()), 3)}
+    if wall_s:
+        out['throughput_rps'] = round(len(a) / wall_s, 1)
+    return out
+
+class Stages:
+    """Times named steps of one process and records the peak RSS after each."""
+
+    def __init__(self):
+        self.results = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        t = time.perf_counter()
+        value = fn(*args, **kwargs)
+        self.results[name] = {'seconds': round(time.perf_counter() - t, 3), 'peak_rss_mb': peak_rss_mb()}
+        return value
+
+# ------------------------------
+# Stages (run inside the scratch directory, one subprocess each)
+# ------------------------------
+def stage_generate(p):
+    import create_dummy_supermart
+    s = Stages()
+    s.run('generate', create_dummy_supermart.main,
+          ['--stores', str(p['stores']), '--products', str(p['products']), '--years', str(p['years']),
+           '--seed', str(p['seed'])] + (['--rows-per-day', str(p['rows_per_day'])] if p['rows_per_day'] else []))
+    return s.results
+
+def stage_eda(p):
+    import eda_and_prepare
+    s = Stages()
+    s.run('eda_and_prepare', eda_and_prepare.main, p['chunksize'])
+    return s.results
+
+def stage_model_build(p):
+    import model_build
+    s = Stages()
+    df = s.run('load_dataset', model_build.load_dataset)
+    target = model_build.choose_target(df)
+    s.run('build_features', model_build.build_features, df, target)
+    s.run('train_full', model_build.train_full, df, target)   # includes its own feature build
+    s.run('build_database', model_build.build_database, df)
+    return {'model_build.' + k: v for k, v in s.results.items()}
+
+def stage_charts(p):
+    import app, star_schema
+    with app.pool.connection() as conn:
+        stores, products = star_schema.dimension_values(conn)
+    keys = (products + stores)[:p['chart_keys']]
+    out = {}
+    for label in ('cold', 'cached'):
+        samples = []
+        for key in keys:
+            t = time.perf_counter()
+            future = app.generate_and_save_charts(key)
+            if future is not None:
+                future.result()
+            samples.append((time.perf_counter() - t) * 1000)
+        out['generate_and_save_charts.' + label] = latency_stats(samples)
+    app.charts.shutdown()
+    out['generate_and_save_charts.cold']['peak_rss_mb'] = peak_rss_mb()
+    out['generate_and_save_charts.cold']['worker_peak_rss_mb'] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return out
+
+def _memory_mb():
+    """(rss, pss) of this process in MB; PSS splits shared pages between the processes using them."""
+    with open('/proc/self/smaps_rollup') as f:
+        kb = {line.split(':')[0]: int(line.split()[1]) for line in f if line.split(':')[0] in ('Rss', 'Pss')}
+    return round(kb['Rss'] / 1024, 1), round(kb['Pss'] / 1024, 1)
+
+def stage_startup(p):
+    """Import time, then N forked workers (as a preloading prefork server would) that each
+    serve a prediction; per-worker RSS/PSS is sampled while all of them are alive."""
+    mode = os.environ.get('SUPERMART_INFERENCE', 'pipeline')
+    t = time.perf_counter()
+    import app, star_schema
+    out = {f'startup.{mode}.import_app': {'seconds': round(time.perf_counter() - t, 3), 'peak_rss_mb': peak_rss_mb()}}
+    t = time.perf_counter()
+    app.preload()
+    out[f'startup.{mode}.preload'] = {'seconds': round(time.perf_counter() - t, 3), 'peak_rss_mb': peak_rss_mb()}
+    with app.pool.connection() as conn:
+        stores, products = star_schema.dimension_values(conn)
+    ready_r, ready_w = os.pipe()
+    go_r, go_w = os.pipe()
+    children = []
+    for i in range(p['startup_workers']):
+        result_r, result_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                app.charts.start()   # as gunicorn.conf.py post_fork does
+                t = time.perf_counter()
+                client = TestClient(app.app)
+                client(*request_for('predict_post', np.random.default_rng(i), stores, products))
+                first = round((time.perf_counter() - t) * 1000, 3)
+                app.prediction_log.flush()
+                os.write(ready_w, b'r')
+                os.read(go_r, 1)
+                rss, pss = _memory_mb()
+                os.write(result_w, json.dumps({'first_request_ms': first, 'rss_mb': rss, 'pss_mb': pss}).encode())
+                app.charts.shutdown()
+            finally:
+                os._exit(0)
+        os.close(result_w)
+        children.append((pid, result_r))
+    for _ in children:
+        os.read(ready_r, 1)
+    os.write(go_w, b'g' * len(children))
+    samples = []
+    for pid, result_r in children:
+        samples.append(json.loads(os.read(result_r, 4096)))
+        os.waitpid(pid, 0)
+    app.charts.shutdown()
+    out[f'startup.{mode}.worker'] = {
+        k: round(float(np.mean([s[k] for s in samples])), 3) for k in ('first_request_ms', 'rss_mb', 'pss_mb')}
+    out[f'startup.{mode}.worker']['workers'] = len(samples)
+    return out
+
+# ------------------------------
+# HTTP load
+# ------------------------------
+def request_for(route, rng, stores, products):
+    """(method, path, form, json) for one request to `route` with randomised inputs."""
+    product = str(rng.choice(products)) if products else ''
+    store = str(rng.choice(stores)) if stores else ''
+    if route == 'index':
+        return 'GET', '/', None, None
+    if route == 'predict_get':
+        return 'GET', '/predict', None, None
+    if route == 'predict_post':
+        form = {'product': product, 'store_location': store,
+                'date': f"2023-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}",
+                'quantity': str(rng.integers(1, 30)), 'unit_price': f"{rng.uniform(0.5, 10):.2f}"}
+        return 'POST', '/predict', form, None
+    if route == 'predictions':
+        return 'GET', '/predictions', None, None
+    if route == 'sql':
+        return 'GET', '/sql', None, None
+    if route == 'filter_data':
+        body = {'year': str(rng.choice(['', '2022', '2023'])), 'product': str(rng.choice(['', product])),
+                'store': str(rng.choice(['', store]))}
+        return 'POST', '/filter_data', None, body
+    if route == 'download_predictions':
+        return 'GET', '/download_predictions', None, None
+    raise ValueError(route)
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def __call__(self, method, path, form, body):
+        r = self.client.open(path, method=method, data=form, json=body)
+        r.get_data()   # drain streamed responses
+        return r.status_code
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HttpClient:
+    """Same interface over a live server; redirects are not followed, as with the test client."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.opener = urllib.request.build_opener(_NoRedirect)
+
+    def __call__(self, method, path, form, body):
+        data, headers = None, {}
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.url + path, data=data, method=method, headers=headers)
+        try:
+            with self.opener.open(req) as r:
+                r.read()
+                return r.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+def drive(make_client, route, total, clients, stores, products, seed):
+    """Issue `total` requests to `route` from `clients` threads; latency stats + error count."""
+    samples, errors = [], [0]
+    lock = threading.Lock()
+
+    def worker(i, n):
+        client = make_client()
+        rng = np.random.default_rng([seed, i])
+        local = []
+        for _ in range(n):
+            req = request_for(route, rng, stores, products)
+            t = time.perf_counter()
+            try:
+                status = client(*req)
+            except Exception:
+                status = 599
+            local.append((time.perf_counter() - t) * 1000)
+            if status >= 500:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            samples.extend(local)
+
+    shares = [total // clients + (i < total % clients) for i in range(clients)]
+    threads = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(shares) if n]
+    t = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    out = latency_stats(samples, time.perf_counter() - t)
+    out['errors'] = errors[0]
+    return out
+
+def stage_http(p):
+    if p['url']:
+        make_client = lambda: HttpClient(p['url'])
+        stores, products = p['stores_list'], p['products_list']
+        flush = lambda: time.sleep(0.5)
+        app = None
+    else:
+        import app, star_schema
+        with app.pool.connection() as conn:
+            stores, products = star_schema.dimension_values(conn)
+        make_client = lambda: TestClient(app.app)
+        flush = app.prediction_log.flush
+    out = {}
+    for route in ROUTES:
+        drive(make_client, route, p['warmup'], 1, stores, products, p['seed'] + 1000)
+        out[route] = drive(make_client, route, p['requests'], p['clients'], stores, products, p['seed'])
+        if route == 'predict_post':
+            flush()   # later routes read the predictions just written
+    if app is not None:
+        app.charts.shutdown()
+        out['result_cache'] = {name: cache.stats() for name, cache in
+                               (('predict', app.prediction_cache), ('filter_data', app.explorer_cache))}
+    out['peak_rss_mb'] = peak_rss_mb()
+    return out
+
+STAGES = {'generate': stage_generate, 'eda': stage_eda, 'model_build': stage_model_build,
+          'charts': stage_charts, 'startup': stage_startup, 'http': stage_http}
+
+# ------------------------------
+# Orchestration
+# ------------------------------
+def prepare_workdir(workdir):
+    os.makedirs(workdir, exist_ok=True)
+    for path in glob.glob(os.path.join(BASE, '*.py')):
+        shutil.copy2(path, workdir)
+    for d in ('templates', 'static'):
+        if os.path.isdir(os.path.join(BASE, d)):
+            shutil.copytree(os.path.join(BASE, d), os.path.join(workdir, d), dirs_exist_ok=True)
+
+def run_stage(workdir, name, params, env=None):
+    t = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.basename(__file__), '--run-stage', name, '--params', json.dumps(params)],
+                          cwd=workdir, capture_output=True, text=True, env=dict(os.environ, **(env or {})))
+    lines = [l for l in proc.stdout.splitlines() if l.startswith(RESULT_PREFIX)]
+    if proc.returncode != 0 or not lines:
+        raise SystemExit(f"Stage {name} failed:\n{proc.stdout[-2000:]}\n{proc.stderr[-4000:]}")
+    print(f"  {name}: {time.perf_counter() - t:.1f}s")
+    return json.loads(lines[-1][len(RESULT_PREFIX):])
+
+def flatten(results):
+    """{metric path: (value, higher_is_better)} for the metrics compared across runs."""
+    flat = {}
+    for name, r in results.get('stages', {}).items():
+        for key in ('seconds', 'peak_rss_mb', 'p95_ms', 'rss_mb', 'pss_mb', 'first_request_ms'):
+            if key in r:
+                flat[f'stages.{name}.{key}'] = (r[key], False)
+    for route, r in results.get('http', {}).items():
+        if isinstance(r, dict):
+            if 'p95_ms' in r:
+                flat[f'http.{route}.p95_ms'] = (r['p95_ms'], False)
+            if 'throughput_rps' in r:
+                flat[f'http.{route}.throughput_rps'] = (r['throughput_rps'], True)
+    return flat
+
+def compare(current, baseline, threshold):
+    """Metrics that got worse than `baseline` by more than `threshold` (fractional)."""
+    regressions = []
+    base = flatten(baseline)
+    for key, (value, higher_is_better) in flatten(current).items():
+        if key not in base or not base[key][0]:
+            continue
+        old = base[key][0]
+        change = (value - old) / old
+        if (-change if higher_is_better else change) > threshold:
+            regressions.append({'metric': key, 'baseline': old, 'current': value, 'change': round(change, 3)})
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Benchmark the Supermart app and offline pipeline')
+    ap.add_argument('--stores', type=int, default=5)
+    ap.add_argument('--products', type=int, default=11)
+    ap.add_argument('--years', type=int, default=2)
+    ap.add_argument('--rows-per-day', type=int, default=None)
+    ap.add_argument('--seed', type=int, default=42)
+    ap.add_argument('--chunksize', type=int, default=None, help='run eda_and_prepare in streaming mode')
+    ap.add_argument('--clients', type=int, default=4)
+    ap.add_argument('--requests', type=int, default=100, help='requests per route')
+    ap.add_argument('--warmup', type=int, default=3)
+    ap.add_argument('--chart-keys', type=int, default=5)
+    ap.add_argument('--startup-workers', type=int, default=3, help='forked workers in the startup stage')
+    ap.add_argument('--url', default=None, help='benchmark a running server instead of the test client')
+    ap.add_argument('--skip', default='', help='comma-separated stages to skip')
+    ap.add_argument('--workdir', default=None)
+    ap.add_argument('--out', default='bench_results.json')
+    ap.add_argument('--baseline', default=None)
+    ap.add_argument('--threshold', type=float, default=0.25)
+    ap.add_argument('--run-stage', default=None, help=argparse.SUPPRESS)
+    ap.add_argument('--params', default='{}', help=argparse.SUPPRESS)
+    a = ap.parse_args(argv)
+
+    if a.run_stage:
+        result = STAGES[a.run_stage](json.loads(a.params))
+        print(RESULT_PREFIX + json.dumps(result))
+        return 0
+
+    params = {k: getattr(a, k) for k in ('stores', 'products', 'years', 'rows_per_day', 'seed', 'chunksize',
+                                         'clients', 'requests', 'warmup', 'chart_keys', 'startup_workers', 'url')}
+    workdir = a.workdir or tempfile.mkdtemp(prefix='supermart-bench-')
+    prepare_workdir(workdir)
+    skip = set(filter(None, a.skip.split(',')))
+    print("Benchmarking in", workdir)
+
+    results = {'meta': {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                        'cpus': os.cpu_count(), 'params': params, 'workdir': workdir},
+               'stages': {}, 'http': {}}
+    for name in ('generate', 'eda', 'model_build', 'charts'):
+        if name not in skip:
+            results['stages'].update(run_stage(workdir, name, params))
+    if 'startup' not in skip:
+        for mode in ('pipeline', 'compiled'):
+            env = {'SUPERMART_INFERENCE': mode, 'SUPERMART_CHARTS_START': '0'}   # as under gunicorn.conf.py
+            results['stages'].update(run_stage(workdir, 'startup', params, env))
+    if 'http' not in skip:
+        if a.url:
+            params['stores_list'], params['products_list'] = [], []
+        results['http'] = run_stage(workdir, 'http', params)
+    rows_file = os.path.join(workdir, 'supermart_snapshot', 'meta.json')
+    if os.path.exists(rows_file):
+        results['meta']['rows'] = json.load(open(rows_file))['rows']
+
+    exit_code = 0
+    if a.baseline:
+        results['regressions'] = compare(results, json.load(open(a.baseline)), a.threshold)
+        for r in results['regressions']:
+            print(f"REGRESSION {r['metric']}: {r['baseline']} -> {r['current']} ({r['change']:+.0%})")
+        exit_code = 1 if results['regressions'] else 0
+    with open(a.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print("Results written to", a.out)
+    if not a.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,266 @@
+# bulk_load.py
+# Atomic bulk reload of supermart.db while the app keeps serving it.
+#
+#   1. Stage: rows are inserted with executemany batches into a throwaway staging database
+#      (journal and fsync off), and the whole star schema is built there: dimensions, fact
+#      table, indexes, ANALYZE stats and the rollup. The filter query plans are checked on
+#      it too, so a plan regression fails the load before anything is live.
+#   2. Copy: the finished tables are copied into "<name>__load" shadow tables of the live
+#      file, COPY_ROWS rows per short IMMEDIATE transaction, so prediction writes get the
+#      lock between chunks instead of waiting for the whole load.
+#   3. Swap: one IMMEDIATE transaction drops the views and triggers, renames the live tables
+#      to "<name>__old" and the shadows into place, recreates views and triggers from the
+#      staging schema and logs the load. It only edits the schema, so it takes the same
+#      time for any row count. WAL readers keep the old snapshot until COMMIT, so /sql and
+#      /filter_data see either the old data or the new, never a mix. The __old tables are
+#      dropped afterwards, one short transaction each.
+import os, re, time, sqlite3
+import numpy as np
+import pandas as pd
+import db, rollups, star_schema
+
+BATCH_ROWS = 50000
+COPY_ROWS = 50000      # rows per live-side copy transaction
+COPY_PAUSE = 0.1       # gap between copy transactions; a waiting writer retries the lock every <=100 ms
+STAGING_TABLE = 'supermart_load'
+MANAGED = star_schema.TABLES + (star_schema.KEYED_VIEW, star_schema.VIEW, rollups.ROLLUP)
+SHADOW, OLD = '__load', '__old'
+
+LOAD_LOG_SQL = """
+CREATE TABLE IF NOT EXISTS load_log (
+    id INTEGER PRIMARY KEY,
+    loaded_at TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    stage_seconds REAL NOT NULL,
+    swap_seconds REAL NOT NULL,
+    rows_per_sec REAL NOT NULL
+)
+"""
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _sql_type(s):
+    # same declared types pandas.to_sql used, so the fact table keeps its column affinities
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return 'TIMESTAMP'
+    if pd.api.types.is_bool_dtype(s) or pd.api.types.is_integer_dtype(s):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(s):
+        return 'REAL'
+    return 'TEXT'
+
+def _column_values(s):
+    """Python-native values of a column (None for missing), ready for sqlite3 binding."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        # format each distinct timestamp once; code -1 (NaT) picks the trailing None
+        codes, uniques = pd.factorize(s)
+        text = np.append(np.asarray(uniques.strftime('%Y-%m-%d %H:%M:%S'), dtype=object), None)
+        return text[codes].tolist()
+    return s.astype(object).where(s.notna(), None).tolist()
+
+def stage_table(conn, name, frames, batch_rows=BATCH_ROWS):
+    """Create `name` from the first frame's columns and fill it with executemany batches.
+
+    `frames` is a DataFrame or an iterable of DataFrame chunks. Returns rows inserted.
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    rows = 0
+    sql = None
+    for df in frames:
+        cols = list(df.columns)
+        if sql is None:
+            conn.execute(f"DROP TABLE IF EXISTS {_q(name)}")
+            conn.execute(f"CREATE TABLE {_q(name)} ({', '.join(f'{_q(c)} {_sql_type(df[c])}' for c in cols)})")
+            sql = f"INSERT INTO {_q(name)} ({', '.join(_q(c) for c in cols)}) VALUES ({', '.join('?' * len(cols))})"
+        for start in range(0, len(df), batch_rows):
+            chunk = df.iloc[start:start + batch_rows]
+            conn.executemany(sql, zip(*(_column_values(chunk[c]) for c in cols)))
+        rows += len(df)
+    return rows
+
+def _objects(conn, schema, kind):
+    return conn.execute(f"SELECT name, tbl_name, sql FROM {schema}.sqlite_master WHERE type=? AND sql IS NOT NULL "
+                        "AND name NOT LIKE 'sqlite_%' ORDER BY rowid", (kind,)).fetchall()
+
+def _sub_name(pattern, name, repl, sql):
+    # `name` bare or double-quoted, followed by whitespace or '('
+    out, n = re.subn(pattern + rf'(?:"{re.escape(name)}"|{re.escape(name)})(?=[\s(])',
+                     lambda m: m.group(1) + repl, sql, count=1, flags=re.I)
+    if not n:
+        raise ValueError(f"Cannot rename {name} in: {sql[:80]}")
+    return out
+
+def _create_sql(sql, kind, name, new_name, on_table=None):
+    """CREATE statement `sql` from sqlite_master, creating main.`new_name` instead of `name`
+    (and for an index, on table `on_table[1]` instead of `on_table[0]`)."""
+    sql = _sub_name(rf'^(CREATE\s+(?:UNIQUE\s+)?{kind}\s+(?:IF\s+NOT\s+EXISTS\s+)?)', name, 'main.' + _q(new_name), sql)
+    if on_table:
+        sql = _sub_name(r'(\sON\s+)', on_table[0], _q(on_table[1]), sql)
+    return sql
+
+def build_staging(stage, raw, tables, batch_rows=BATCH_ROWS):
+    """Fill the staging connection with the finished schema. Returns rows loaded."""
+    stage.execute("BEGIN")
+    rows = stage_table(stage, STAGING_TABLE, raw, batch_rows)
+    for name, df in tables.items():
+        stage_table(stage, name, df() if callable(df) else df, batch_rows)
+    missing = star_schema.missing_columns(stage, STAGING_TABLE)
+    if missing:
+        # no star schema, rollup or filter indexes without the dimensions; keep a plain table
+        print(f"No {', '.join(missing)} column(s); loading supermart_raw as a plain table.")
+        stage.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO {star_schema.VIEW}")
+        stage.execute("ANALYZE")
+        stage.execute("COMMIT")
+        return rows
+    star_schema.build_star(stage, STAGING_TABLE)
+    stage.execute(f"DROP TABLE {STAGING_TABLE}")
+    db.create_raw_indexes(stage)
+    rollups.populate_rollups(stage)
+    stage.execute("COMMIT")
+    # a filter that regressed to a full scan fails the load here, before the swap
+    db.check_query_plans(stage)
+    return rows
+
+def _drop_leftovers(conn):
+    # shadow / old tables of an interrupted load (a suffix match in Python: LIKE treats _ as a wildcard)
+    for (name,) in conn.execute("SELECT name FROM main.sqlite_master WHERE type='table'").fetchall():
+        if not name.endswith((SHADOW, OLD)):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(f"DROP TABLE {_q(name)}")
+        conn.execute("COMMIT")
+
+def copy_to_shadows(conn, batch_rows=COPY_ROWS):
+    """Copy every staging table into a shadow table of the live file, with its indexes.
+    Returns {table: {staging index name: live index name}}."""
+    taken = {r[0] for r in conn.execute("SELECT name FROM main.sqlite_master WHERE type='index'")}
+    index_names = {}
+    for name, _, sql in _objects(conn, 'staging', 'table'):
+        shadow = name + SHADOW
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(_create_sql(sql, 'TABLE', name, shadow))
+        # live index names must differ from the ones on the current table; alternate suffixes
+        index_names[name] = {}
+        for idx, tbl, idx_sql in _objects(conn, 'staging', 'index'):
+            if tbl == name:
+                live = idx + '__b' if idx in taken else idx
+                index_names[name][idx] = live
+                conn.execute(_create_sql(idx_sql, 'INDEX', idx, live, (name, shadow)))
+        conn.execute("COMMIT")
+        without_rowid = 'WITHOUT ROWID' in sql.upper()
+        if without_rowid:
+            # small (the rollup); one statement
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"INSERT INTO main.{_q(shadow)} SELECT * FROM staging.{_q(name)}")
+            conn.execute("COMMIT")
+            continue
+        # keyset chunks on rowid, which is kept (fact rowids appear in API page cursors)
+        cols = ', '.join(_q(r[1]) for r in conn.execute(f"PRAGMA staging.table_info({_q(name)})"))
+        last = -2**63
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            copied = conn.execute(f"INSERT INTO main.{_q(shadow)} (rowid, {cols}) SELECT rowid, {cols} "
+                                  f"FROM staging.{_q(name)} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                  (last, batch_rows)).rowcount
+            conn.execute("COMMIT")
+            if copied < batch_rows:
+                break
+            last = conn.execute(f"SELECT MAX(rowid) FROM main.{_q(shadow)}").fetchone()[0]
+            time.sleep(COPY_PAUSE)
+    return index_names
+
+def swap_in(conn, index_names):
+    """Replace the live tables with their shadows inside the caller's transaction. The
+    replaced tables are left as <name>__old, to be dropped after COMMIT."""
+    names = set(index_names)
+    views = _objects(conn, 'staging', 'view')
+    triggers = _objects(conn, 'staging', 'trigger')
+    # everything a load owns goes, even if this load does not recreate it (plain-table fallback)
+    replaced = names | {r[0] for r in views} | set(MANAGED)
+    trigger_names = {r[0] for r in triggers}
+    # views and triggers first: they reference the tables being renamed
+    for kind in ('trigger', 'view'):
+        for name, tbl, _ in _objects(conn, 'main', kind):
+            if name in replaced or tbl in replaced or name in trigger_names:
+                conn.execute(f"DROP {kind.upper()} IF EXISTS {_q(name)}")
+    for (name,) in conn.execute("SELECT name FROM main.sqlite_master WHERE type='table'").fetchall():
+        if name in replaced:
+            conn.execute(f"ALTER TABLE main.{_q(name)} RENAME TO {_q(name + OLD)}")
+    for name in names:
+        conn.execute(f"ALTER TABLE main.{_q(name + SHADOW)} RENAME TO {_q(name)}")
+    for _, _, sql in views + triggers:
+        conn.execute(sql)
+    # planner stats computed on the staging copy, under the live index names
+    conn.execute("ANALYZE main.sqlite_master")   # creates sqlite_stat1 if missing
+    conn.execute(f"DELETE FROM main.sqlite_stat1 WHERE tbl IN ({', '.join('?' * len(names))})", list(names))
+    if conn.execute("SELECT 1 FROM staging.sqlite_master WHERE name='sqlite_stat1'").fetchone():
+        for tbl, idx, stat in conn.execute("SELECT tbl, idx, stat FROM staging.sqlite_stat1").fetchall():
+            if tbl in names:
+                conn.execute("INSERT INTO main.sqlite_stat1 VALUES (?,?,?)",
+                             (tbl, index_names[tbl].get(idx, idx), stat))
+
+def reload(path, raw, tables=None, batch_rows=BATCH_ROWS):
+    """Replace supermart_raw (star schema + rollup) and the plain `tables` {name: DataFrame}
+    in the database at `path` atomically. `raw` may be a DataFrame or an iterable of chunks;
+    a `tables` value may be a callable, called once `raw` has been read (e.g. to return
+    aggregates collected from the chunks). Returns load stats."""
+    tables = tables or {}
+    staging_path = path + '.staging'
+    for suffix in ('', '-journal'):
+        if os.path.exists(staging_path + suffix):
+            os.remove(staging_path + suffix)
+
+    t0 = time.perf_counter()
+    stage = sqlite3.connect(staging_path, isolation_level=None)
+    try:
+        stage.execute("PRAGMA journal_mode=OFF")
+        stage.execute("PRAGMA synchronous=OFF")
+        rows = build_staging(stage, raw, tables, batch_rows)
+    except BaseException:
+        stage.close()
+        os.remove(staging_path)
+        raise
+    stage.close()
+    stage_seconds = time.perf_counter() - t0
+
+    # a plain connection: the copy chunks are expected to be slow, keep them out of the slow-query log
+    conn = sqlite3.connect(path, isolation_level=None)
+    for pragma in db.PRAGMAS:
+        conn.execute(pragma)
+    try:
+        conn.execute("ATTACH DATABASE ? AS staging", (staging_path,))
+        try:
+            _drop_leftovers(conn)
+            t1 = time.perf_counter()
+            index_names = copy_to_shadows(conn)
+            t2 = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                swap_in(conn, index_names)
+                swap_seconds = time.perf_counter() - t2
+                total = stage_seconds + (t2 - t1) + swap_seconds
+                stats = {"rows": rows, "stage_seconds": round(stage_seconds, 3), "copy_seconds": round(t2 - t1, 3),
+                         "swap_seconds": round(swap_seconds, 3), "rows_per_sec": round(rows / max(total, 1e-9), 1)}
+                conn.execute(LOAD_LOG_SQL)
+                stats["version"] = conn.execute(
+                    "INSERT INTO load_log (loaded_at, rows, stage_seconds, swap_seconds, rows_per_sec) "
+                    "VALUES (datetime('now'), ?, ?, ?, ?)",
+                    (rows, stats["stage_seconds"], stats["swap_seconds"], stats["rows_per_sec"])).lastrowid
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.execute("DETACH DATABASE staging")
+        _drop_leftovers(conn)
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    finally:
+        conn.close()
+        os.remove(staging_path)
+    return stats
@@ -0,0 +1,127 @@
+# chart_service.py
+import os, re, hashlib, threading, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+MONTHLY_TOTALS_SQL = """
+    SELECT printf('%04d-%02d', year, month) AS month, SUM(total_sum)
+    FROM sales_rollup
+    WHERE year > 0
+    GROUP BY year, month
+    ORDER BY year, month;
+"""
+
+
+def render_trend_png(points, title, path):
+    """Draw a monthly trend line to `path`. Runs inside a worker process."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    labels = [p[0] for p in points]
+    values = [p[1] for p in points]
+    tmp = path + '.tmp.png'
+    fig = plt.figure(figsize=(8, 4))
+    plt.plot(range(len(values)), values, marker='o')
+    step = max(1, len(labels) // 24)
+    plt.xticks(range(0, len(labels), step), labels[::step], rotation=45)
+    plt.title(title)
+    plt.tight_layout()
+    fig.savefig(tmp)
+    plt.close(fig)
+    os.replace(tmp, path)  # readers never see a half-written PNG
+    return path
+
+
+def safe_key(key):
+    return re.sub(r'[^\w\- ]', '_', str(key or 'chart')).strip() or 'chart'
+
+
+class ChartService:
+    """Renders charts in a process pool (matplotlib is not thread-safe).
+
+    Charts are cached by a version derived from the monthly aggregate plus the chart
+    parameters; a request for a chart that is already current is free, and concurrent
+    requests for the same chart share one in-flight render.
+    """
+
+    def __init__(self, pool, outdir, workers=1, start=True):
+        self.pool = pool
+        self.outdir = outdir
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._versions = {}  # filename -> version of the PNG on disk
+        self.renders = self.cache_hits = self.deduped = 0
+        if hasattr(os, 'register_at_fork'):   # POSIX only
+            os.register_at_fork(after_in_child=self._after_fork)
+        if start:
+            self.start()
+
+    def _after_fork(self):
+        # the parent's executor (and its manager thread) is unusable in a forked child;
+        # the child creates its own pool on first render (the old one is kept referenced so
+        # its finalizer never signals the parent's manager thread)
+        self._forked, self._executor = self._executor, None
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def start(self):
+        """Start the worker processes now.
+
+        Call this early at import time: on POSIX the workers are forked, so starting them
+        before the model is loaded and before background threads exist keeps them small and
+        safe. (spawn would re-import the app's __main__ in every worker.)
+        """
+        with self._lock:
+            self._get_executor()
+        for f in [self._executor.submit(os.getpid) for _ in range(self.workers)]:
+            f.result()
+
+    def _get_executor(self):
+        if self._executor is None:
+            method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+            ctx = multiprocessing.get_context(method)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return self._executor
+
+    def monthly_totals(self):
+        with self.pool.connection() as conn:
+            return [(m, float(t or 0)) for m, t in conn.execute(MONTHLY_TOTALS_SQL).fetchall()]
+
+    def version(self, filename):
+        return self._versions.get(filename)
+
+    def render_trend(self, key):
+        """Schedule the monthly trend chart for `key`. Returns a Future, or None when cached."""
+        key = safe_key(key)
+        filename = f"{key}_trend.png"
+        path = os.path.join(self.outdir, filename)
+        points = self.monthly_totals()
+        title = f"Monthly Sales Trend - {key}"
+        version = hashlib.sha1(repr((points, title)).encode()).hexdigest()[:16]
+        with self._lock:
+            if self._versions.get(filename) == version and os.path.exists(path):
+                self.cache_hits += 1
+                return None
+            inflight = self._inflight.get((filename, version))
+            if inflight is not None:
+                self.deduped += 1
+                return inflight
+            future = self._get_executor().submit(render_trend_png, points, title, path)
+            self._inflight[(filename, version)] = future
+            self.renders += 1
+        future.add_done_callback(lambda f: self._done(filename, version, f))
+        return future
+
+    def _done(self, filename, version, future):
+        with self._lock:
+            self._inflight.pop((filename, version), None)
+            if future.exception() is None:
+                self._versions[filename] = version
+            else:
+                print("Chart generation error:", future.exception())
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
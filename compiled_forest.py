@@ -0,0 +1,167 @@
+# compiled_forest.py
+import os, struct, zipfile
+import numpy as np
+
+CHUNK_ROWS = 2048
+COMPACT_EVERY = 4
+
+
+class CompiledForest:
+    """NumPy-only stand-in for the Pipeline(SimpleImputer, StandardScaler, RandomForestRegressor).
+
+    The imputer fill values and scaler mean/scale are applied as one vectorised transform, and
+    every tree is flattened into shared node arrays so a batch walks all trees at once.
+    Leaves point to themselves with an infinite threshold, so finished paths can take extra
+    steps harmlessly; they are dropped from the active set every few levels.
+    """
+
+    def __init__(self, fill, mean, scale, feature, threshold, left, right, value, roots, depth, feature_names=()):
+        self.fill = fill
+        self.mean = mean
+        self.scale = scale
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.depth = int(depth)
+        self.is_leaf = np.isinf(threshold)
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object) if len(feature_names) else None
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        X = np.where(np.isnan(X), self.fill, X)
+        # Trees compare float32 features against float64 thresholds, same as sklearn
+        return ((X - self.mean) / self.scale).astype(np.float32)
+
+    def predict(self, X):
+        Xt = self.transform(X)
+        out = np.empty(Xt.shape[0])
+        for start in range(0, Xt.shape[0], CHUNK_ROWS):
+            out[start:start + CHUNK_ROWS] = self._walk(Xt[start:start + CHUNK_ROWS])
+        return out
+
+    def _walk(self, Xt):
+        n, n_features = Xt.shape
+        n_trees = len(self.roots)
+        flat = Xt.ravel()
+        # One slot per (row, tree); base is the row's offset into the flattened input
+        node = np.tile(self.roots, n)
+        base = np.repeat(np.arange(n, dtype=np.int32) * n_features, n_trees)
+        active = np.arange(n * n_trees)
+        cur, offs = node.copy(), base
+        for step in range(1, self.depth + 1):
+            go_left = flat[offs + self.feature[cur]] <= self.threshold[cur]
+            cur = np.where(go_left, self.left[cur], self.right[cur])
+            if step % COMPACT_EVERY == 0 or step == self.depth:
+                # Drop slots that reached a leaf so deep trees don't drag shallow paths along
+                node[active] = cur
+                keep = ~self.is_leaf[cur]
+                active, cur = active[keep], cur[keep]
+                if not len(active):
+                    break
+                offs = base[active]
+        return self.value[node].reshape(n, n_trees).mean(axis=1)
+
+    def save(self, path):
+        # Uncompressed so the arrays can be memory-mapped on load. Written to a temp file and
+        # renamed: truncating a file that running processes have mapped would crash them.
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, fill=self.fill, mean=self.mean, scale=self.scale, feature=self.feature,
+                     threshold=self.threshold, left=self.left, right=self.right, value=self.value,
+                     roots=self.roots, depth=np.array(self.depth),
+                     feature_names=np.array(self.feature_names_in_ if self.feature_names_in_ is not None else [], dtype=str))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """Load a saved forest; with mmap=True the node arrays are read-only views of the
+        file, so every process serving the same model shares one copy in the page cache."""
+        arrays = _mmap_npz(path) if mmap else None
+        if arrays is None:
+            with np.load(path) as z:
+                arrays = {k: z[k] for k in z.files}
+        arrays['depth'] = int(arrays['depth'])
+        arrays['feature_names'] = arrays['feature_names'].tolist()
+        return cls(**arrays)
+
+
+def _mmap_npz(path):
+    """Memory-map every array of an uncompressed .npz; None if a member is compressed."""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED or not info.filename.endswith('.npy'):
+                return None
+            # local file header: 30 fixed bytes, then name and extra field, then the .npy data
+            f.seek(info.header_offset)
+            name_len, extra_len = struct.unpack('<26xHH', f.read(30))
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            shape, fortran, dtype = (np.lib.format.read_array_header_1_0(f) if version == (1, 0)
+                                     else np.lib.format.read_array_header_2_0(f))
+            key = info.filename[:-4]
+            if dtype.hasobject:
+                return None
+            if not shape or 0 in shape:
+                arrays[key] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+            else:
+                arrays[key] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                        order='F' if fortran else 'C')
+    return arrays
+
+
+def compile_pipeline(pipe):
+    """Flatten a fitted imputer/scaler/forest pipeline into a CompiledForest."""
+    imp, sc, rf = pipe.named_steps['imp'], pipe.named_steps['sc'], pipe.named_steps['rf']
+    n_features = rf.n_features_in_
+    if len(imp.statistics_) != n_features:
+        raise ValueError("Imputer dropped columns; compiled mode needs a 1:1 feature layout")
+    mean = sc.mean_ if sc.mean_ is not None else np.zeros(n_features)
+    scale = sc.scale_ if sc.scale_ is not None else np.ones(n_features)
+
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset, depth = 0, 0
+    for est in rf.estimators_:
+        t = est.tree_
+        ids = np.arange(t.node_count)
+        leaf = t.children_left == -1
+        feature.append(np.where(leaf, 0, t.feature))
+        threshold.append(np.where(leaf, np.inf, t.threshold))
+        left.append(np.where(leaf, ids, t.children_left) + offset)
+        right.append(np.where(leaf, ids, t.children_right) + offset)
+        value.append(t.value[:, 0, 0])
+        roots.append(offset)
+        offset += t.node_count
+        depth = max(depth, t.max_depth)
+
+    return CompiledForest(
+        fill=np.asarray(imp.statistics_, dtype=np.float64),
+        mean=np.asarray(mean, dtype=np.float64),
+        scale=np.asarray(scale, dtype=np.float64),
+        feature=np.concatenate(feature).astype(np.int32),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        left=np.concatenate(left).astype(np.int32),
+        right=np.concatenate(right).astype(np.int32),
+        value=np.concatenate(value).astype(np.float64),
+        roots=np.asarray(roots, dtype=np.int32),
+        depth=depth,
+        feature_names=list(getattr(pipe, 'feature_names_in_', [])),
+    )
+
+
+def load_compiled(path, mmap=True):
+    if os.path.exists(path):
+        try:
+            return CompiledForest.load(path, mmap=mmap)
+        except Exception as e:
+            print("Compiled model load failed:", e)
+    return None
@@ -1,16 +1,178 @@
 # create_dummy_supermart.py
-import pandas as pd, random, os
-dates = pd.date_range("2022-01-01","2023-12-31", freq='D')
-products = ['Milk','Bread','Eggs','Butter','Apples','Bananas','Rice','Sugar','Soap','Toothpaste','Shampoo']
-stores = ['Downtown','Mall','Uptown','Suburb','Airport']
-rows=[]
-random.seed(42)
-for d in dates:
-    for s in stores:
-        for p in random.sample(products, k=5):
-            qty = random.randint(1,30)
-            price = round(random.uniform(0.5,10.0),2)
-            rows.append({'date':d.strftime('%Y-%m-%d'),'store_location':s,'product':p,'quantity':qty,'unit_price':price,'total':qty*price})
-df = pd.DataFrame(rows)
-df.to_csv('Supermart Grocery Sales - Retail Analytics Dataset.csv', index=False)
-print("Created synthetic dataset")
+# Synthetic Supermart sales for development and load testing.
+#
+#   python create_dummy_supermart.py                         ~18k rows, same shape as before
+#   python create_dummy_supermart.py --stores 50 --products 500 --years 3 --rows-per-day 10000
+#   python create_dummy_supermart.py ... --format sqlite|snapshot --out PATH --workers N --seed S
+#
+# Rows are sampled with NumPy a block of days at a time: store and product popularity follow
+# Zipf-like weights, quantities are Poisson with monthly seasonality and a weekend lift, and
+# each product has a log-normal base price with small per-row noise and yearly drift. Blocks
+# are generated in parallel processes from per-block seeds, so output depends only on --seed.
+import os, sys, time, argparse
+from collections import deque
+import numpy as np
+import pandas as pd
+
+BASE = os.path.dirname(__file__)
+CSV = os.path.join(BASE, 'Supermart Grocery Sales - Retail Analytics Dataset.csv')
+DB = os.path.join(BASE, 'supermart.db')
+SNAPSHOT = os.path.join(BASE, 'supermart_snapshot')
+
+PRODUCTS = ['Milk','Bread','Eggs','Butter','Apples','Bananas','Rice','Sugar','Soap','Toothpaste','Shampoo']
+STORES = ['Downtown','Mall','Uptown','Suburb','Airport']
+BLOCK_ROWS = 500000   # target rows generated per task
+
+def day_range(start, years):
+    first = pd.Timestamp(start)
+    return np.arange(first.to_datetime64(), (first + pd.DateOffset(years=years)).to_datetime64(), dtype='datetime64[D]')
+
+def names(defaults, n, prefix):
+    return defaults[:n] + [f"{prefix} {i:03d}" for i in range(len(defaults) + 1, n + 1)]
+
+class Catalog:
+    """Per-run store/product parameters, derived from the seed so every worker agrees."""
+
+    def __init__(self, stores, products, seed):
+        rng = np.random.default_rng([seed, 0])
+        self.stores = np.array(names(STORES, stores, 'Store'), dtype=object)
+        self.products = np.array(names(PRODUCTS, products, 'Product'), dtype=object)
+        self.store_p = self._zipf(stores, 0.6, rng)
+        self.product_p = self._zipf(products, 0.9, rng)
+        self.base_price = np.round(np.clip(rng.lognormal(1.2, 0.6, products), 0.5, 50.0), 2)
+        self.base_qty = rng.uniform(3.0, 15.0, products)
+        self.season_amp = rng.uniform(0.05, 0.35, products)
+        self.season_phase = rng.uniform(0, 2 * np.pi, products)
+
+    @staticmethod
+    def _zipf(n, s, rng):
+        w = 1.0 / np.arange(1, n + 1) ** s
+        w = w[rng.permutation(n)]
+        return w / w.sum()
+
+def generate_block(catalog, days, rows_per_day, seed, block):
+    """DataFrame of rows_per_day rows for each day in `days` (datetime64[D] array)."""
+    rng = np.random.default_rng([seed, 1, block])
+    n = len(days) * rows_per_day
+    date = np.repeat(days, rows_per_day)
+    store = rng.choice(len(catalog.stores), size=n, p=catalog.store_p)
+    product = rng.choice(len(catalog.products), size=n, p=catalog.product_p)
+
+    month = (date.astype('datetime64[M]').astype(np.int64) % 12)
+    weekday = (date.astype(np.int64) + 3) % 7          # 1970-01-01 was a Thursday; 5, 6 = Sat, Sun
+    years = (date.astype('datetime64[Y]').astype(np.int64) - 52).astype(float)  # price drift from 2022
+    season = 1 + catalog.season_amp[product] * np.sin(2 * np.pi * month / 12 + catalog.season_phase[product])
+    lam = catalog.base_qty[product] * season * np.where(weekday >= 5, 1.3, 1.0)
+    quantity = 1 + rng.poisson(lam)
+    unit_price = np.round(catalog.base_price[product] * 1.03 ** years * rng.lognormal(0, 0.05, n), 2)
+
+    return pd.DataFrame({
+        'date': date.astype('datetime64[s]'),
+        'store_location': pd.Categorical.from_codes(store, categories=catalog.stores),
+        'product': pd.Categorical.from_codes(product, categories=catalog.products),
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'total': np.round(quantity * unit_price, 2),
+    })
+
+def _task(args):
+    catalog, days, rows_per_day, seed, block, fmt = args
+    df = generate_block(catalog, days, rows_per_day, seed, block)
+    if fmt == 'csv':
+        # format in the worker so the parent only concatenates bytes
+        return df.to_csv(index=False, header=block == 0, date_format='%Y-%m-%d').encode()
+    return df
+
+def blocks(stores=5, products=11, start='2022-01-01', years=2, rows_per_day=None, seed=42, workers=None, fmt='frame'):
+    """Yield generated blocks in date order (CSV bytes for fmt='csv', else DataFrames)."""
+    catalog = Catalog(stores, products, seed)
+    rows_per_day = rows_per_day or stores * 5
+    days = day_range(start, years)
+    per_block = max(1, BLOCK_ROWS // rows_per_day)
+    tasks = [(catalog, days[i:i + per_block], rows_per_day, seed, b, fmt)
+             for b, i in enumerate(range(0, len(days), per_block))]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        yield from map(_task, tasks)
+        return
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    # at most 2 blocks per worker in flight, so a slow writer does not buffer the whole dataset
+    # spawn where fork is unavailable (_task and its arguments pickle)
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method)) as ex:
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+            pending.append(ex.submit(_task, task))
+        while pending:
+            yield pending.popleft().result()
+
+def write_csv(path, chunks):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        for data in chunks:
+            f.write(data)
+    os.replace(tmp, path)
+
+def write_snapshot(path, chunks):
+    from snapshot import SnapshotWriter
+    w = SnapshotWriter(path)
+    for df in chunks:
+        w.append(df)
+    w.close()
+
+class MonthlyTotals:
+    """Passes blocks through while summing total and quantity per month, so sales_by_month
+    is built without holding the whole dataset (same shape as model_build.build_database)."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.parts = []
+
+    def __iter__(self):
+        for df in self.chunks:
+            month = df['date'].dt.to_period('M').astype(str).rename('month')
+            self.parts.append(df.groupby(month)[['total', 'quantity']].sum())
+            yield df
+
+    def frame(self):
+        if not self.parts:
+            return pd.DataFrame(columns=['month', 'total', 'quantity'])
+        # a month can span two blocks
+        return pd.concat(self.parts).groupby(level=0).sum().reset_index()[['month', 'total', 'quantity']]
+
+def write_sqlite(path, chunks):
+    import bulk_load
+    monthly = MonthlyTotals(chunks)
+    stats = bulk_load.reload(path, monthly, tables={'sales_by_month': monthly.frame})
+    print(f"Loaded {stats['rows']} rows at {stats['rows_per_sec']:.0f} rows/s")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Generate synthetic Supermart sales data')
+    ap.add_argument('--stores', type=int, default=len(STORES))
+    ap.add_argument('--products', type=int, default=len(PRODUCTS))
+    ap.add_argument('--start', default='2022-01-01')
+    ap.add_argument('--years', type=int, default=2)
+    ap.add_argument('--rows-per-day', type=int, default=None, help='default: 5 per store')
+    ap.add_argument('--seed', type=int, default=42)
+    ap.add_argument('--workers', type=int, default=None, help='default: all CPUs')
+    ap.add_argument('--format', choices=['csv', 'sqlite', 'snapshot'], default='csv')
+    ap.add_argument('--out', default=None)
+    a = ap.parse_args(argv)
+    t = time.perf_counter()
+    fmt = 'csv' if a.format == 'csv' else 'frame'
+    chunks = blocks(a.stores, a.products, a.start, a.years, a.rows_per_day, a.seed, a.workers, fmt)
+    if a.format == 'csv':
+        write_csv(a.out or CSV, chunks)
+    elif a.format == 'snapshot':
+        write_snapshot(a.out or SNAPSHOT, chunks)
+    else:
+        write_sqlite(a.out or DB, chunks)
+    rows = (a.rows_per_day or a.stores * 5) * len(day_range(a.start, a.years))
+    secs = time.perf_counter() - t
+    print(f"Created synthetic dataset: {rows} rows in {secs:.1f}s ({rows / secs:,.0f} rows/s) -> {a.out or a.format}")
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,325 @@
+# db.py
+# Shared SQLite helpers for supermart.db
+import os, json, time, base64, sqlite3, threading
+from contextlib import contextmanager
+import metrics
+
+# Applied to every pooled connection. WAL lets readers run while the prediction writer
+# commits; NORMAL sync is durable across app crashes and only fsyncs at checkpoints.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-32000",      # ~32 MB page cache per connection
+    "PRAGMA mmap_size=268435456",    # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+)
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports execute() time (up to the first row) to metrics."""
+
+    def execute(self, sql, params=()):
+        t = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            metrics.observe_sql(sql, params, time.perf_counter() - t)
+
+    def executemany(self, sql, seq):
+        t = time.perf_counter()
+        try:
+            return super().executemany(sql, seq)
+        finally:
+            metrics.observe_sql(sql, '<executemany>', time.perf_counter() - t)
+
+class TimedConnection(sqlite3.Connection):
+    # Connection.execute() and pandas both go through cursor(), so this covers every query
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+def connect(path):
+    """Open a connection with the tuned pragmas applied (SQL-timed when metrics are on)."""
+    factory = TimedConnection if metrics.REGISTRY.enabled else sqlite3.Connection
+    conn = sqlite3.connect(path, check_same_thread=False, factory=factory)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def file_id(path):
+    try:
+        st = os.stat(path)
+        return (st.st_dev, st.st_ino)
+    except OSError:
+        return None
+
+class ConnectionPool:
+    """Small pool of long-lived connections shared by request threads.
+
+    Connections are reused across requests instead of being opened per route. If the
+    database file is replaced on disk (new inode), idle connections are discarded and
+    fresh ones open against the new file. Forked children start with an empty pool.
+    """
+
+    def __init__(self, path, max_idle=8):
+        self.path = path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._file = file_id(path)
+        self.opened = 0
+        if hasattr(os, 'register_at_fork'):   # POSIX only
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # SQLite connections must not cross fork; the child drops (without closing) the
+        # parent's idle connections and opens its own
+        self._forked, self._idle = self._idle, []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        current = file_id(self.path)
+        with self._lock:
+            if current != self._file:
+                stale, self._idle, self._file = self._idle, [], current
+            else:
+                stale = []
+                if self._idle:
+                    return self._idle.pop(), current
+        for c in stale:
+            c.close()
+        self.opened += 1
+        return connect(self.path), current
+
+    def _release(self, conn, file_id):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if file_id == self._file and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block."""
+        conn, file_id = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        else:
+            self._release(conn, file_id)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for c in idle:
+            c.close()
+
+# Composite indexes on the fact table matching the explorer's filter combinations
+# (year is a range on the integer date_id, product/store are surrogate keys)
+RAW_INDEXES = {
+    'idx_fact_date': '(date_id)',
+    'idx_fact_product_date': '(product_id, date_id)',
+    'idx_fact_store_date': '(store_id, date_id)',
+    'idx_fact_product_store_date': '(product_id, store_id, date_id)',
+}
+
+def create_raw_indexes(conn):
+    """Create the fact_sales filter indexes and refresh planner stats (caller's transaction)."""
+    for name, cols in RAW_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON fact_sales {cols}")
+    conn.execute("ANALYZE")
+
+def ensure_raw_indexes(conn):
+    """Create the fact_sales filter indexes if the table exists."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='fact_sales'").fetchone() is None:
+        return False
+    with conn:
+        create_raw_indexes(conn)
+    return True
+
+def data_version(conn):
+    """Id of the last bulk reload (bulk_load.py), 0 if the DB was never reloaded."""
+    try:
+        return conn.execute("SELECT IFNULL(MAX(id), 0) FROM load_log").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+def raw_is_plain(conn):
+    """True when supermart_raw is a plain table: a load without the dimension columns
+    (see bulk_load.build_staging) has no star schema, rollup or filter indexes."""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='supermart_raw'").fetchone() is not None
+
+def raw_version(conn):
+    """Change marker for supermart_raw: last bulk reload and newest fact row (appends go
+    through the view's insert trigger, so they move MAX(rowid) without a reload)."""
+    table = 'supermart_raw' if raw_is_plain(conn) else 'fact_sales'
+    try:
+        newest = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0]
+    except sqlite3.OperationalError:
+        newest = None
+    return data_version(conn), newest
+
+def year_range(year):
+    """date_id bounds [start, end) for a year, so the date index can be range-scanned.
+    A year that is not a number matches no rows (an empty range), as a text match would."""
+    try:
+        y = int(year)
+    except (TypeError, ValueError):
+        return 0, 0
+    return y * 10000, (y + 1) * 10000
+
+def raw_filter(year=None, product=None, store=None, columns=None):
+    """WHERE clause and params over supermart_raw_keyed filtered by year/product/store.
+
+    With `columns` (those of a plain supermart_raw table) the filter is on the table's own
+    columns instead, and a filter on a column it lacks matches nothing.
+    """
+    if columns is not None:
+        return _plain_filter(year, product, store, columns)
+    where = ["1=1"]
+    params = []
+    if year:
+        start, end = year_range(year)
+        where.append("date_id >= ? AND date_id < ?")
+        params += [start, end]
+    if product:
+        where.append("product_id = (SELECT product_id FROM dim_product WHERE product=?)")
+        params.append(product)
+    if store:
+        where.append("store_id = (SELECT store_id FROM dim_store WHERE store_location=?)")
+        params.append(store)
+    return " AND ".join(where), params
+
+def _plain_filter(year, product, store, columns):
+    where = ["1=1"]
+    params = []
+    if year:
+        start, end = year_range(year)
+        if 'date' in columns and start:
+            # dates are stored as 'YYYY-MM-DD HH:MM:SS' text (bulk_load)
+            where.append("date >= ? AND date < ?")
+            params += [f"{start // 10000:04d}-01-01", f"{end // 10000:04d}-01-01"]
+        else:
+            where.append("0")
+    for col, value in (('product', product), ('store_location', store)):
+        if not value:
+            continue
+        if col in columns:
+            where.append(f"{col} = ?")
+            params.append(value)
+        else:
+            where.append("0")
+    return " AND ".join(where), params
+
+def raw_where(conn, year=None, product=None, store=None):
+    """raw_filter() for whichever supermart_raw layout the database has."""
+    return raw_filter(year, product, store, raw_columns(conn) if raw_is_plain(conn) else None)
+
+def raw_columns(conn):
+    """Columns of the supermart_raw compatibility view, in their original order."""
+    return [r[1] for r in conn.execute("PRAGMA table_info(supermart_raw)")]
+
+def raw_select_sql(conn, where_sql):
+    """SELECT of the original supermart_raw columns, filtered on the keyed view (or on the
+    plain table itself)."""
+    cols = ", ".join('"' + c.replace('"', '""') + '"' for c in raw_columns(conn))
+    source = "supermart_raw" if raw_is_plain(conn) else "supermart_raw_keyed"
+    return f"SELECT {cols} FROM {source} WHERE {where_sql}"
+
+def full_scans(conn, sql, params=()):
+    """Plan steps of a query that scan a table without an index."""
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [row[-1] for row in plan if row[-1].startswith('SCAN') and 'USING' not in row[-1]]
+
+def check_query_plans(conn):
+    """Raise if any filtered explorer query falls back to a full scan of supermart_raw."""
+    combos = [(y, p, s) for y in ('', '2023') for p in ('', 'Milk') for s in ('', 'Mall') if y or p or s]
+    for combo in combos:
+        where_sql, params = raw_filter(*combo)
+        scans = full_scans(conn, raw_select_sql(conn, where_sql) + " LIMIT 2000", params)
+        if scans:
+            raise AssertionError(f"Full scan for filter {combo}: {scans}")
+        plan = conn.execute("EXPLAIN QUERY PLAN " + raw_page_sql(conn, where_sql, [0, 0]),
+                            params + [0, 0, 100]).fetchall()
+        if any('TEMP B-TREE' in row[-1] or (row[-1].startswith('SCAN') and 'USING' not in row[-1]) for row in plan):
+            raise AssertionError(f"Keyset page for filter {combo} does not follow an index: {plan}")
+
+# ------------------------------
+# Keyset pagination
+# ------------------------------
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(token, valid=None):
+    """Key encoded in `token` (None for no token). ValueError if it does not decode or
+    `valid(key)` rejects its shape."""
+    if not token:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if valid is not None and not valid(key):
+        raise ValueError("Invalid cursor")
+    return key
+
+def _is_int(v):
+    return isinstance(v, int) and not isinstance(v, bool)
+
+def _is_raw_key(key):
+    return isinstance(key, list) and len(key) == 2 and all(_is_int(v) for v in key)
+
+def page_size(value, default=100):
+    try:
+        n = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        raise ValueError("Invalid page size")
+    return max(1, min(n, MAX_PAGE_SIZE))
+
+def columnar(cursor, rows, skip=0):
+    """Column-oriented payload {'columns': [...], 'data': [[col0...], [col1...]]}."""
+    names = [d[0] for d in cursor.description][skip:]
+    data = [list(col) for col in zip(*rows)][skip:] if rows else [[] for _ in names]
+    return {"columns": names, "data": data}
+
+def predictions_page(conn, cursor_token=None, limit=100):
+    """Newest-first page of predictions, keyed on id."""
+    last_id = decode_cursor(cursor_token, _is_int)
+    where, params = ("WHERE id < ?", [last_id]) if last_id is not None else ("", [])
+    cur = conn.execute(f"SELECT * FROM predictions {where} ORDER BY id DESC LIMIT ?", params + [limit])
+    rows = cur.fetchall()
+    page = columnar(cur, rows)
+    page["next_cursor"] = encode_cursor(rows[-1][0]) if len(rows) == limit else None
+    return page
+
+def raw_page_sql(conn, where_sql, after):
+    # (date_id, fact rowid) follows every filter index from RAW_INDEXES, so pages come off the index in order
+    if raw_is_plain(conn):
+        # no date_id: pages in rowid order, the key keeps the same [0, rowid] shape
+        keyset = " AND (0, rowid) > (?, ?)" if after is not None else ""
+        select = raw_select_sql(conn, where_sql + keyset).replace("SELECT ", "SELECT 0, rowid, ", 1)
+        return select + " ORDER BY rowid LIMIT ?"
+    keyset = " AND (date_id, fact_rowid) > (?, ?)" if after is not None else ""
+    select = raw_select_sql(conn, where_sql + keyset).replace("SELECT ", "SELECT date_id, fact_rowid, ", 1)
+    return select + " ORDER BY date_id, fact_rowid LIMIT ?"
+
+def raw_page(conn, where_sql, params, cursor_token=None, limit=100):
+    """Page of supermart_raw rows matching raw_filter(), keyed on (date_id, fact rowid)."""
+    after = decode_cursor(cursor_token, _is_raw_key)
+    sql = raw_page_sql(conn, where_sql, after)
+    cur = conn.execute(sql, list(params) + (list(after) if after is not None else []) + [limit])
+    rows = cur.fetchall()
+    page = columnar(cur, rows, skip=2)
+    page["next_cursor"] = encode_cursor([rows[-1][0], rows[-1][1]]) if len(rows) == limit else None
+    return page
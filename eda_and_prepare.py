@@ -1,10 +1,20 @@
 # eda_and_prepare.py
-import os, pandas as pd, matplotlib.pyplot as plt, numpy as np
+import os, sys, pandas as pd, matplotlib.pyplot as plt, numpy as np
+from snapshot import SnapshotWriter, write_snapshot
 BASE = os.path.dirname(__file__)
 CSV = os.path.join(BASE, "Supermart Grocery Sales - Retail Analytics Dataset.csv")
+CLEANED = os.path.join(BASE, 'supermart_cleaned.csv')
+SNAPSHOT = os.path.join(BASE, 'supermart_snapshot')
 OUTDIR = os.path.join(BASE, "static", "charts")
 os.makedirs(OUTDIR, exist_ok=True)
 
+# Streaming mode: rows per chunk and the date format to parse with (None = guessed from the
+# schema sample, e.g. '%m-%d-%Y' for the Supermart CSV). A chunk in which more than
+# MAX_BAD_DATES of the non-empty dates do not parse stops the run.
+CHUNKSIZE = 500000
+DATE_FORMAT = None
+MAX_BAD_DATES = 0.5
+
 def load_or_create():
     if os.path.exists(CSV):
         df = pd.read_csv(CSV, encoding='utf-8', low_memory=False)
@@ -12,9 +22,12 @@ def load_or_create():
         raise SystemExit("CSV not found. Run create_dummy_supermart.py or place the CSV file.")
     return df
 
+def normalise_columns(cols):
+    return [c.strip().lower().replace(' ','_') for c in cols]
+
 def clean(df):
     # lowercase columns
-    df.columns = [c.strip().lower().replace(' ','_') for c in df.columns]
+    df.columns = normalise_columns(df.columns)
     # try to parse dates
     for c in df.columns:
         if 'date' in c:
@@ -34,40 +47,188 @@ def clean(df):
     df = df.drop_duplicates().reset_index(drop=True)
     return df
 
-def create_charts(df):
-    # sales by store / city
-    if 'store_location' in df.columns:
-        s = df.groupby('store_location')['total'].sum().sort_values(ascending=False).head(12)
+# ------------------------------
+# Charts
+# ------------------------------
+def plot_charts(by_store=None, by_product=None, by_month=None, corr=None):
+    """Draw the dashboard charts from precomputed aggregates."""
+    if by_store is not None:
+        s = by_store.sort_values(ascending=False).head(12)
         plt.figure(figsize=(8,4)); s.plot.bar(); plt.title('Top store locations by sales'); plt.tight_layout()
         plt.savefig(os.path.join(OUTDIR,'sales_by_location.png')); plt.close()
-    # top products
-    if 'product' in df.columns:
-        p = df.groupby('product')['quantity'].sum().sort_values(ascending=False).head(12)
+    if by_product is not None:
+        p = by_product.sort_values(ascending=False).head(12)
         plt.figure(figsize=(8,4)); p.plot.bar(); plt.title('Top products by quantity'); plt.tight_layout()
         plt.savefig(os.path.join(OUTDIR,'top_products.png')); plt.close()
-    # sales by month
-    datecol = None
-    for c in df.columns:
-        if 'date' in c:
-            datecol = c; break
-    if datecol:
-        tmp = df.copy(); tmp['month']=tmp[datecol].dt.to_period('M')
-        m = tmp.groupby('month')['total'].sum().sort_index()
+    if by_month is not None:
+        m = by_month.sort_index()
         plt.figure(figsize=(10,4)); m.plot(marker='o'); plt.title('Sales by month'); plt.xticks(rotation=45); plt.tight_layout()
         plt.savefig(os.path.join(OUTDIR,'sales_by_month.png')); plt.close()
-    # correlation heatmap if numeric cols
-    num = df.select_dtypes(include=[np.number]).corr()
-    if not num.empty:
+    if corr is not None and not corr.empty:
         plt.figure(figsize=(6,5)); import seaborn as sns
-        sns.heatmap(num, annot=False, cmap='coolwarm'); plt.title('Numeric correlation'); plt.tight_layout()
+        sns.heatmap(corr, annot=False, cmap='coolwarm'); plt.title('Numeric correlation'); plt.tight_layout()
         plt.savefig(os.path.join(OUTDIR,'corr_heatmap.png')); plt.close()
 
-def main():
-    df = load_or_create()
-    df = clean(df)
-    df.to_csv(os.path.join(BASE,'supermart_cleaned.csv'), index=False)
-    create_charts(df)
-    print("Saved cleaned CSV and charts to static/charts")
+def create_charts(df):
+    by_store = df.groupby('store_location')['total'].sum() if 'store_location' in df.columns else None
+    by_product = df.groupby('product')['quantity'].sum() if 'product' in df.columns else None
+    datecol = next((c for c in df.columns if 'date' in c), None)
+    by_month = df.groupby(df[datecol].dt.to_period('M'))['total'].sum() if datecol else None
+    plot_charts(by_store, by_product, by_month, df.select_dtypes(include=[np.number]).corr())
+
+# ------------------------------
+# Streaming ETL (bounded memory)
+# ------------------------------
+class SeenRows:
+    """Set of 64-bit row hashes kept as sorted NumPy runs (8 bytes per distinct row)."""
+
+    def __init__(self, max_runs=8):
+        self.runs = []
+        self.max_runs = max_runs
+
+    def filter_new(self, hashes):
+        """Boolean mask of rows not seen before (also drops repeats within `hashes`)."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        new = ~pd.Series(hashes).duplicated().to_numpy()
+        for run in self.runs:
+            idx = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            new &= run[idx] != hashes
+        fresh = np.unique(hashes[new])
+        if len(fresh):
+            self.runs.append(fresh)
+            if len(self.runs) > self.max_runs:
+                self.runs = [np.unique(np.concatenate(self.runs))]
+        return new
+
+class ChartAggregates:
+    """Per-chunk accumulation of the chart aggregates and pairwise correlation moments."""
+
+    def __init__(self):
+        self.by_store = None; self.by_product = None; self.by_month = None
+        self.num_cols = None
+        self.n = self.sx = self.sxx = self.sxy = None
+
+    @staticmethod
+    def _add(acc, part):
+        return part if acc is None else acc.add(part, fill_value=0)
+
+    def update(self, df, datecol):
+        if 'store_location' in df.columns:
+            self.by_store = self._add(self.by_store, df.groupby('store_location')['total'].sum())
+        if 'product' in df.columns:
+            self.by_product = self._add(self.by_product, df.groupby('product')['quantity'].sum())
+        if datecol:
+            self.by_month = self._add(self.by_month, df.groupby(df[datecol].dt.to_period('M'))['total'].sum())
+        num = df.select_dtypes(include=[np.number])
+        if self.num_cols is None:
+            self.num_cols = list(num.columns)
+            k = len(self.num_cols)
+            self.n, self.sx, self.sxx, self.sxy = (np.zeros((k, k)) for _ in range(4))
+        X = num.reindex(columns=self.num_cols).to_numpy(dtype=float)
+        M = (~np.isnan(X)).astype(float)
+        Z = np.nan_to_num(X)
+        # pairwise-complete moments, same definition pandas' DataFrame.corr uses
+        self.n += M.T @ M
+        self.sx += Z.T @ M          # sx[i, j] = sum of x_i over rows where x_j is present
+        self.sxx += (Z * Z).T @ M
+        self.sxy += Z.T @ Z
+
+    def corr(self):
+        if not self.num_cols:
+            return pd.DataFrame()
+        n, sx, sxx, sxy = self.n, self.sx, self.sxx, self.sxy
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = n * sxy - sx * sx.T
+            var = (n * sxx - sx ** 2) * (n * sxx - sx ** 2).T
+            r = cov / np.sqrt(var)
+        return pd.DataFrame(np.clip(r, -1, 1), index=self.num_cols, columns=self.num_cols)
+
+def infer_schema(sample):
+    """Run clean() on a sample and return its column dtypes as the declared schema."""
+    cleaned = clean(sample.copy())
+    return {c: str(t) for c, t in cleaned.dtypes.items()}
+
+def infer_date_formats(sample, schema, date_format=DATE_FORMAT):
+    """strftime format of each date column in the raw (string) sample: `date_format` if
+    given, else guessed from the column's first value."""
+    from pandas.tseries.api import guess_datetime_format
+    sample = sample.set_axis(normalise_columns(sample.columns), axis=1)
+    formats = {}
+    for c, t in schema.items():
+        if t.startswith('datetime'):
+            values = sample[c].dropna()
+            formats[c] = date_format or (guess_datetime_format(values.iloc[0]) if len(values) else None)
+    return formats
+
+def clean_chunk(df, schema, date_formats):
+    df.columns = normalise_columns(df.columns)
+    for c, t in schema.items():
+        if c not in df.columns:
+            continue
+        if t.startswith('datetime'):
+            raw = df[c]
+            df[c] = pd.to_datetime(raw, format=date_formats.get(c), errors='coerce')
+            given = raw.notna() & (raw.str.strip() != '')
+            bad = int((given & df[c].isna()).sum())
+            if bad and bad > MAX_BAD_DATES * given.sum():
+                raise ValueError(f"{bad} of {int(given.sum())} values in column {c!r} do not parse as "
+                                 f"{date_formats.get(c)!r} (e.g. {raw[given & df[c].isna()].iloc[0]!r}); "
+                                 "set DATE_FORMAT")
+        elif t.startswith(('int', 'float')):
+            col = df[c] if pd.api.types.is_numeric_dtype(df[c]) else df[c].str.replace(',', '')
+            df[c] = pd.to_numeric(col, errors='coerce')
+    if 'quantity' in df.columns and 'unit_price' in df.columns:
+        df['total'] = (df['total'] if 'total' in df.columns else np.nan)
+        df['total'] = df['total'].fillna(df['quantity'] * df['unit_price'])
+    return df
+
+def stream_clean(csv=CSV, out=CLEANED, chunksize=CHUNKSIZE, date_format=DATE_FORMAT, snapshot=SNAPSHOT):
+    """Clean `csv` chunk by chunk into `out` (and the columnar `snapshot`, if given);
+    peak memory is bounded by `chunksize`.
+
+    Returns the ChartAggregates accumulated along the way.
+    """
+    if not os.path.exists(csv):
+        raise SystemExit("CSV not found. Run create_dummy_supermart.py or place the CSV file.")
+    sample = pd.read_csv(csv, encoding='utf-8', nrows=min(chunksize, 50000), dtype=str)
+    schema = infer_schema(sample)
+    date_formats = infer_date_formats(sample, schema, date_format)
+    datecol = next((c for c, t in schema.items() if t.startswith('datetime')), None)
+    seen, aggs = SeenRows(), ChartAggregates()
+    snap = SnapshotWriter(snapshot) if snapshot else None
+    rows_in = rows_out = 0
+    if os.path.exists(out):
+        os.remove(out)
+    for chunk in pd.read_csv(csv, encoding='utf-8', chunksize=chunksize, dtype=str):
+        rows_in += len(chunk)
+        chunk = clean_chunk(chunk, schema, date_formats)
+        chunk = chunk[seen.filter_new(pd.util.hash_pandas_object(chunk, index=False).to_numpy())]
+        rows_out += len(chunk)
+        chunk.to_csv(out, mode='a', header=not os.path.exists(out), index=False)
+        if snap:
+            snap.append(chunk)
+        aggs.update(chunk, datecol)
+    if snap:
+        snap.close()
+    print(f"Streamed {rows_in} rows ({rows_in - rows_out} duplicates dropped)")
+    return aggs
+
+def main(chunksize=None):
+    if chunksize:
+        aggs = stream_clean(chunksize=chunksize)
+        plot_charts(aggs.by_store, aggs.by_product, aggs.by_month, aggs.corr())
+    else:
+        df = load_or_create()
+        df = clean(df)
+        df.to_csv(CLEANED, index=False)
+        write_snapshot(df, SNAPSHOT)
+        create_charts(df)
+    print("Saved cleaned CSV, columnar snapshot and charts to static/charts")
 
 if __name__ == '__main__':
-    main()
+    # python eda_and_prepare.py --stream [chunksize]
+    if '--stream' in sys.argv:
+        rest = sys.argv[sys.argv.index('--stream') + 1:]
+        main(int(rest[0]) if rest else CHUNKSIZE)
+    else:
+        main()
@@ -0,0 +1,201 @@
+# feature_encoder.py
+import os, json, datetime, threading
+from functools import lru_cache
+import numpy as np
+import model_registry
+
+# Columns model_build.py falls back to when feature_columns.json is missing
+BASE_COLUMNS = ['year', 'month', 'quantity', 'unit_price']
+PRODUCT_PREFIX = 'product_top_'
+STORE_PREFIX = 'store_location_top_'
+
+
+@lru_cache(maxsize=4096)
+def parse_year_month(date):
+    """(year, month) for a date string, (0, 0) when it cannot be parsed."""
+    if not date:
+        return 0, 0
+    try:
+        d = datetime.date.fromisoformat(date[:10])
+        return d.year, d.month
+    except ValueError:
+        pass
+    try:
+        import pandas as pd
+        d = pd.to_datetime(date)
+        return int(d.year), int(d.month)
+    except Exception:
+        return 0, 0
+
+
+def _text(v):
+    if v is None or v != v:  # None / NaN
+        return ''
+    return str(v)
+
+
+def _number(v):
+    try:
+        v = float(v or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if v != v else v
+
+
+class FeatureEncoder:
+    """Maps raw form/JSON inputs straight into NumPy rows laid out like feature_columns.json."""
+
+    def __init__(self, columns):
+        self.columns = list(columns) or list(BASE_COLUMNS)
+        self.index = {c: i for i, c in enumerate(self.columns)}
+        self.width = len(self.columns)
+        self._year = self.index.get('year', -1)
+        self._month = self.index.get('month', -1)
+        self._quantity = self.index.get('quantity', -1)
+        self._unit_price = self.index.get('unit_price', -1)
+
+    @classmethod
+    def from_file(cls, path):
+        cols = []
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    cols = json.load(f)
+            except Exception as e:
+                print("Feature columns load failed:", e)
+        return cls(cols)
+
+    def parse(self, rec):
+        """Normalise one input mapping to (product, store_location, date, year, month, quantity, unit_price)."""
+        date = _text(rec.get('date'))
+        year, month = parse_year_month(date)
+        return (_text(rec.get('product')), _text(rec.get('store_location')), date,
+                year, month, _number(rec.get('quantity')), _number(rec.get('unit_price')))
+
+    def encode_one(self, rec):
+        """Encode a single row into a (1, width) array. Returns (X, parsed)."""
+        parsed = self.parse(rec)
+        X = np.zeros((1, self.width))
+        self._fill(X, 0, parsed)
+        return X, parsed
+
+    def encode_many(self, records):
+        """Encode a batch of rows into an (n, width) array. Returns (X, parsed_rows)."""
+        parsed = [self.parse(r) for r in records]
+        n = len(parsed)
+        X = np.zeros((n, self.width))
+        if not n:
+            return X, parsed
+        products, stores, _, years, months, qty, price = zip(*parsed)
+        for col, values in ((self._year, years), (self._month, months),
+                            (self._quantity, qty), (self._unit_price, price)):
+            if col >= 0:
+                X[:, col] = values
+        rows = np.arange(n)
+        for prefix, values in ((PRODUCT_PREFIX, products), (STORE_PREFIX, stores)):
+            lookup = {v: self.index.get(prefix + v, -1) for v in set(values)}
+            cols = np.fromiter((lookup[v] for v in values), dtype=np.intp, count=n)
+            hit = cols >= 0
+            X[rows[hit], cols[hit]] = 1.0
+        return X, parsed
+
+    def _fill(self, X, i, parsed):
+        product, store, _, year, month, qty, price = parsed
+        if self._year >= 0: X[i, self._year] = year
+        if self._month >= 0: X[i, self._month] = month
+        if self._quantity >= 0: X[i, self._quantity] = qty
+        if self._unit_price >= 0: X[i, self._unit_price] = price
+        j = self.index.get(PRODUCT_PREFIX + product)
+        if j is not None: X[i, j] = 1.0
+        j = self.index.get(STORE_PREFIX + store)
+        if j is not None: X[i, j] = 1.0
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ModelStore:
+    """Holds the model and its encoder, reloading both when their files change on disk.
+
+    With `registry` (a model_registry root) the paths come from the current version in
+    registry.json, so publishing or rolling back a version switches models atomically. If
+    the version lacks `artifact`, `fallback` (artifact, loader), e.g. the pipeline when a
+    compiled export was skipped, serves that same version; the plain paths are used only
+    when there is no registered version.
+    """
+
+    def __init__(self, model_path, features_path, loader, registry=None, artifact='model', fallback=None):
+        self.model_path = model_path
+        self.features_path = features_path
+        self.loader = loader
+        self.registry = registry
+        self.artifact = artifact
+        self.fallback = fallback
+        self.version = None
+        self.loads = 0
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._resolved = (None, None)
+        self._current = (None, FeatureEncoder(BASE_COLUMNS))
+        self._versioned = self._current + (None,)
+        self.get()
+
+    def _paths(self):
+        """(version, artifact, model path, features path) to serve."""
+        if self.registry is None:
+            return None, self.artifact, self.model_path, self.features_path
+        reg_stamp = _mtime(os.path.join(self.registry, model_registry.REGISTRY_FILE))
+        if reg_stamp != self._resolved[0]:
+            entry = model_registry.current_version(self.registry) if reg_stamp is not None else None
+            paths = None
+            if entry is not None:
+                for artifact in (self.artifact, self.fallback and self.fallback[0]):
+                    model_path = artifact and model_registry.artifact_path(self.registry, entry, artifact)
+                    if model_path and os.path.exists(model_path):
+                        paths = (entry["id"], artifact, model_path,
+                                 model_registry.artifact_path(self.registry, entry, 'features'))
+                        break
+            self._resolved = (reg_stamp, paths)
+        return self._resolved[1] or (None, self.artifact, self.model_path, self.features_path)
+
+    def _stamps(self):
+        version, artifact, model_path, features_path = self._paths()
+        return (version, artifact, model_path, features_path, _mtime(model_path), _mtime(features_path))
+
+    def get(self):
+        """Return a consistent (model, encoder) pair, reloading if the files changed."""
+        stamp = self._stamps()
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    version, artifact, model_path, features_path = stamp[:4]
+                    loader = self.loader if artifact == self.artifact else self.fallback[1]
+                    model = loader(model_path)
+                    encoder = FeatureEncoder.from_file(features_path)
+                    names = getattr(model, 'feature_names_in_', None)
+                    if names is not None and list(names) != encoder.columns:
+                        print("Model/feature column mismatch; check feature_columns.json")
+                    self._current = (model, encoder)
+                    self._versioned = (model, encoder, repr(stamp))
+                    self._stamp = stamp
+                    self.version = version
+                    self.loads += 1
+        return self._current
+
+    def versioned(self):
+        """(model, encoder, stamp) where stamp is a string naming the loaded files and their
+        mtimes, the same in every process serving them (used as a result-cache version)."""
+        self.get()
+        return self._versioned
+
+    @property
+    def model(self):
+        return self.get()[0]
+
+    @property
+    def encoder(self):
+        return self.get()[1]
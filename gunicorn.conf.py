@@ -0,0 +1,27 @@
+# gunicorn.conf.py
+#   gunicorn app:app        (read automatically from the working directory)
+# The app is imported once in the master and the workers are forked from it, so pandas,
+# the model and the compiled forest's memory-mapped arrays are shared between workers
+# instead of being loaded by each one.
+import os
+
+# the compiled forest is memory-mapped from its .npz, so every worker reads one page-cache copy
+os.environ.setdefault('SUPERMART_INFERENCE', 'compiled')
+# the master never renders charts; each worker starts its own chart pool in post_fork
+os.environ['SUPERMART_CHARTS_START'] = '0'
+
+bind = os.environ.get('SUPERMART_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('SUPERMART_WORKERS', '4'))
+preload_app = True
+
+def when_ready(server):
+    import app
+    app.preload()
+    server.log.info("Supermart app imported in %.2fs (model %s, %s mode)",
+                    app.STARTUP_SECONDS, app.models.version or 'unversioned', app.INFERENCE_MODE)
+
+def post_fork(server, worker):
+    # before the worker starts any thread (write-behind, gthread), so the chart
+    # processes are forked from a single-threaded process
+    import app
+    app.charts.start()
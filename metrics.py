@@ -0,0 +1,175 @@
+# metrics.py
+# In-process instrumentation exposed as Prometheus text on /metrics.
+#
+#   SUPERMART_METRICS=0            disable (timers become a shared no-op context manager)
+#   SUPERMART_SLOW_QUERY_MS=100    SQL statements slower than this go to the slow-query log
+#
+# Histograms and counters are plain dicts keyed by label values behind one lock each; values
+# that other components already count (model loads, chart renders, write-behind stats) are
+# read through collector callbacks at scrape time instead of being counted twice.
+import os, re, time, bisect, logging, threading, contextlib
+from functools import lru_cache
+from collections import deque
+
+ENABLED = os.environ.get('SUPERMART_METRICS', '1') not in ('0', 'false', 'no', '')
+SLOW_QUERY_MS = float(os.environ.get('SUPERMART_SLOW_QUERY_MS', '100'))
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+log = logging.getLogger('supermart.metrics')
+_NULL = contextlib.nullcontext()
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _num(v):
+    return repr(float(v)) if isinstance(v, float) else str(int(v))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _labels(self.labels, k), v) for k, v in items]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(labels)
+            if v is None:
+                v = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            v[i] += 1
+            v[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = []
+        for k, v in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), v[:-1]):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                out.append((self.name + '_bucket', _labels(self.labels + ('le',), k + (le,)), cumulative))
+            out.append((self.name + '_sum', _labels(self.labels, k), v[-1]))
+            out.append((self.name + '_count', _labels(self.labels, k), cumulative))
+        return out
+
+
+class Registry:
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labels=()):
+        m = Counter(name, help, labels)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        m = Histogram(name, help, labels, buckets)
+        self._metrics.append(m)
+        return m
+
+    def collector(self, fn):
+        """Register fn() -> [(name, kind, help, value)], read on every scrape."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for m in self._metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(f"{name}{labels} {_num(value)}" for name, labels, value in m.samples())
+        for fn in self._collectors:
+            try:
+                for name, kind, help, value in fn():
+                    lines.append(f"# HELP {name} {help}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    lines.append(f"{name} {_num(value)}")
+            except Exception as e:
+                log.warning("metrics collector %s failed: %s", getattr(fn, '__name__', fn), e)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram('supermart_http_request_duration_seconds',
+                                     'Request latency by route, method and status.', ('route', 'method', 'status'))
+STAGE_SECONDS = REGISTRY.histogram('supermart_stage_duration_seconds',
+                                   'Time spent in named stages of a route.', ('route', 'stage'))
+SQL_SECONDS = REGISTRY.histogram('supermart_sql_duration_seconds',
+                                 'SQLite execute() time (to first row) by statement kind and table.', ('statement',))
+SLOW_QUERIES = REGISTRY.counter('supermart_sql_slow_queries_total',
+                                'Statements slower than SUPERMART_SLOW_QUERY_MS.', ('statement',))
+
+
+class _Stage:
+    __slots__ = ('route', 'stage', 'start')
+
+    def __init__(self, route, stage):
+        self.route, self.stage = route, stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.route, self.stage)
+
+
+def stage(route, name):
+    """Context manager timing one stage of `route`; a shared no-op when metrics are off."""
+    return _Stage(route, name) if REGISTRY.enabled else _NULL
+
+# ------------------------------
+# SQL timing and slow-query log
+# ------------------------------
+_STATEMENT = re.compile(r'\b(FROM|INTO|UPDATE|TABLE|ON)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?("?[\w.]+"?)', re.I)
+slow_queries = deque(maxlen=100)
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """Low-cardinality label for a statement: verb plus first table, e.g. 'SELECT sales_rollup'."""
+    sql = sql.lstrip()
+    verb = sql.split(None, 1)[0].upper() if sql else ''
+    m = _STATEMENT.search(sql)
+    return f"{verb} {m.group(2).strip(chr(34))}" if m else verb
+
+def observe_sql(sql, params, seconds):
+    label = statement_label(sql)
+    SQL_SECONDS.observe(seconds, label)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(label)
+        entry = {'at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'ms': round(seconds * 1000, 2),
+                 'statement': ' '.join(sql.split())[:2000], 'params': repr(params)[:500]}
+        slow_queries.append(entry)
+        log.warning("slow query %.1f ms: %s params=%s", entry['ms'], entry['statement'], entry['params'])
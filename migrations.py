@@ -0,0 +1,79 @@
+# migrations.py
+# Versioned, one-time schema upgrades for supermart.db, tracked in PRAGMA user_version.
+# App start-up only reads user_version; steps run once per database, under a file lock so
+# several workers booting together do not race. Can also be run ahead of a deploy:
+#   python migrations.py [path/to/supermart.db]
+import os, sys
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+from contextlib import contextmanager
+import db, rollups, star_schema
+
+def _columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+def create_predictions(conn):
+    with conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            product TEXT,
+            store_location TEXT,
+            date TEXT,
+            year INTEGER,
+            quantity REAL,
+            unit_price REAL,
+            predicted_total REAL
+        );
+        """)
+        # tables created before the year column existed
+        if 'year' not in _columns(conn, 'predictions'):
+            conn.execute("ALTER TABLE predictions ADD COLUMN year INTEGER;")
+
+def upgrade_raw_table(conn):
+    # pre-star databases: wide supermart_raw -> star schema, plus rollup and filter indexes
+    star_schema.migrate_wide_table(conn)
+    rollups.ensure_rollups(conn)
+    db.ensure_raw_indexes(conn)
+
+# Append only; a database at user_version N has run MIGRATIONS[:N]
+MIGRATIONS = [create_predictions, upgrade_raw_table]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+@contextmanager
+def _file_lock(path):
+    if fcntl is None:
+        # no flock; the prefork servers that boot several workers at once are POSIX-only
+        yield
+        return
+    with open(path + '.migrate.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def migrate(conn, path):
+    """Run pending migrations on `conn` (the database at `path`). Returns the steps applied."""
+    if schema_version(conn) >= len(MIGRATIONS):
+        return []
+    applied = []
+    with _file_lock(path):
+        version = schema_version(conn)
+        for i, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {i}")
+            conn.commit()
+            applied.append(step.__name__)
+    return applied
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), 'supermart.db')
+    conn = db.connect(path)
+    print("Applied:", migrate(conn, path) or "nothing, schema is current", "- version", schema_version(conn))
+    conn.close()
@@ -1,69 +1,256 @@
 # model_build.py
-import os, joblib, json, sqlite3
+#   python model_build.py                  full retrain + full DB rebuild
+#   python model_build.py --incremental [--trees N] [--workers N]
+#       fit trees on the rows dated after the current version's last day (plus a sample of older
+#       rows), add them to the current forest, append the rows the DB lacks, and publish a new
+#       version in models/registry.json. New data is found by day: rows added later to a day that
+#       was already trained / loaded need a full build.
+import os, sys, joblib, json, sqlite3
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
+from compiled_forest import compile_pipeline
+from snapshot import load_snapshot
+import bulk_load
+import model_registry
 
 BASE = os.path.dirname(__file__)
 CSV = os.path.join(BASE,'supermart_cleaned.csv')
+SNAPSHOT = os.path.join(BASE,'supermart_snapshot')
 MODEL = os.path.join(BASE,'model_supermart.pkl')
+COMPILED = os.path.join(BASE,'model_supermart_compiled.npz')
 FEATURES = os.path.join(BASE,'feature_columns.json')
 DB = os.path.join(BASE,'supermart.db')
+MODELS = os.path.join(BASE,'models')
 
-if not os.path.exists(CSV):
-    raise SystemExit("Run eda_and_prepare.py first to create supermart_cleaned.csv")
-
-df = pd.read_csv(CSV, low_memory=False)
-# choose target
-target = 'total' if 'total' in df.columns else ('quantity' if 'quantity' in df.columns else None)
-if target is None:
-    raise SystemExit("No suitable target (total/quantity) found in cleaned CSV.")
-
-# basic feature engineering
-X = pd.DataFrame()
-if 'date' in df.columns:
-    df['date'] = pd.to_datetime(df['date'], errors='coerce')
-    X['year'] = df['date'].dt.year.fillna(0)
-    X['month'] = df['date'].dt.month.fillna(0)
-# create dummies for product and store_location top categories
-for col in ['product','store_location','category']:
-    if col in df.columns:
-        top = df[col].value_counts().nlargest(20).index.tolist()
-        X[col+'_top'] = df[col].where(df[col].isin(top),'other')
-if 'quantity' in df.columns:
-    X['quantity'] = df['quantity']
-if 'unit_price' in df.columns:
-    X['unit_price'] = df['unit_price']
-
-X = pd.get_dummies(X, drop_first=True)
-y = df[target].astype(float).fillna(0.0)
-mask = y.notna() & X.notna().all(axis=1)
-X = X[mask]; y = y[mask]
-
-# persist feature columns
-json.dump(X.columns.tolist(), open(FEATURES,'w'), indent=2)
-
-pipe = Pipeline([('imp', SimpleImputer(strategy='median')), ('sc', StandardScaler()), ('rf', RandomForestRegressor(n_estimators=150, random_state=42, n_jobs=-1))])
-if len(X) < 10:
-    print("Not enough rows to train. Need at least 10 rows.")
-else:
-    X_train, X_test, y_train, y_test = train_test_split(X,y,test_size=0.2, random_state=42)
-    pipe.fit(X_train, y_train)
+N_ESTIMATORS = 150
+TREES_PER_PARTITION = 10
+HISTORY_RATIO = 4   # older rows sampled per new row when fitting incremental trees
+
+# ------------------------------
+# Data and features
+# ------------------------------
+def load_dataset():
+    # prefer the typed, memory-mapped snapshot written by eda_and_prepare.py over re-parsing the CSV
+    snap = load_snapshot(SNAPSHOT)
+    if snap is not None:
+        df = snap.to_frame()
+    elif os.path.exists(CSV):
+        df = pd.read_csv(CSV, low_memory=False)
+    else:
+        raise SystemExit("Run eda_and_prepare.py first to create supermart_snapshot / supermart_cleaned.csv")
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    return df
+
+def choose_target(df):
+    target = 'total' if 'total' in df.columns else ('quantity' if 'quantity' in df.columns else None)
+    if target is None:
+        raise SystemExit("No suitable target (total/quantity) found in cleaned CSV.")
+    return target
+
+def build_features(df, target, columns=None):
+    """Feature matrix and target. With `columns` (an existing model's layout) the
+    categories and column order are taken from it instead of from the data."""
+    X = pd.DataFrame(index=df.index)
+    if 'date' in df.columns:
+        X['year'] = df['date'].dt.year.fillna(0)
+        X['month'] = df['date'].dt.month.fillna(0)
+    # create dummies for product and store_location top categories
+    for col in ['product','store_location','category']:
+        if col in df.columns:
+            if columns is None:
+                top = df[col].value_counts().nlargest(20).index.tolist()
+            else:
+                top = [c[len(col)+5:] for c in columns if c.startswith(col + '_top_')]
+            X[col+'_top'] = df[col].astype(object).where(df[col].isin(top),'other')
+    if 'quantity' in df.columns:
+        X['quantity'] = df['quantity']
+    if 'unit_price' in df.columns:
+        X['unit_price'] = df['unit_price']
+
+    X = pd.get_dummies(X, drop_first=columns is None)
+    if columns is not None:
+        X = X.reindex(columns=columns, fill_value=0)
+    y = df[target].astype(float).fillna(0.0)
+    mask = y.notna() & X.notna().all(axis=1)
+    return X[mask], y[mask]
+
+def partition_keys(df):
+    """Monthly date partition ('YYYY-MM') of each row."""
+    return df['date'].dt.strftime('%Y-%m')
+
+def last_day(df):
+    """Latest day in the data ('YYYY-MM-DD'), None without dates."""
+    d = df['date'].max() if 'date' in df.columns else None
+    return None if pd.isna(d) else d.strftime('%Y-%m-%d')
+
+def rows_after(df, entry):
+    """Mask of the rows `entry` was not trained on: days after its `through` day, or for
+    versions published without one, months missing from its partitions."""
+    if entry.get("through"):
+        return df['date'].dt.normalize() > pd.Timestamp(entry["through"])
+    return df['date'].notna() & ~partition_keys(df).isin(entry["partitions"])
+
+# ------------------------------
+# Training
+# ------------------------------
+def export_compiled(pipe, X_test, preds):
+    # flattened forest for the app's compiled inference mode, only if it matches the pipeline
+    compiled = compile_pipeline(pipe)
+    if np.allclose(compiled.predict(X_test.to_numpy(dtype=float)), preds, rtol=1e-9, atol=1e-9):
+        return compiled
+    print("Compiled model does not match pipeline predictions; not exported.")
+    return None
+
+def save_current(pipe, columns, compiled):
+    """Mirror the current version to the legacy top-level artifact paths."""
+    json.dump(list(columns), open(FEATURES,'w'), indent=2)
+    joblib.dump(pipe, MODEL)
+    if compiled is not None:
+        compiled.save(COMPILED)
+    elif os.path.exists(COMPILED):
+        os.remove(COMPILED)   # it belongs to an older model
+
+def train_full(df, target):
+    X, y = build_features(df, target)
+    if len(X) < 10:
+        print("Not enough rows to train. Need at least 10 rows.")
+        json.dump(X.columns.tolist(), open(FEATURES,'w'), indent=2)
+        return None
+    pipe = Pipeline([('imp', SimpleImputer(strategy='median')), ('sc', StandardScaler()), ('rf', RandomForestRegressor(n_estimators=N_ESTIMATORS, random_state=42, n_jobs=-1))])
+    with model_registry.Timer() as t:
+        X_train, X_test, y_train, y_test = train_test_split(X,y,test_size=0.2, random_state=42)
+        pipe.fit(X_train, y_train)
     preds = pipe.predict(X_test)
     mae = (abs(preds - y_test)).mean()
-    joblib.dump(pipe, MODEL)
-    print("Trained model saved to", MODEL, "MAE:", mae)
-
-# create sqlite db with raw and aggregated tables for SQL page
-conn = sqlite3.connect(DB)
-df.to_sql('supermart_raw', conn, if_exists='replace', index=False)
-# aggregated monthly sales
-if 'date' in df.columns:
-    agg = df.groupby([df['date'].dt.to_period('M')]).agg({'total':'sum','quantity':'sum'}).reset_index()
-    agg['month'] = agg['date'].astype(str)
-    agg[['month','total','quantity']].to_sql('sales_by_month', conn, if_exists='replace', index=False)
-conn.close()
-print("DB built at", DB)
+    compiled = export_compiled(pipe, X_test, preds)
+    save_current(pipe, X.columns, compiled)
+    entry = model_registry.publish(MODELS, pipe, X.columns, {"mae": float(mae), "rows": int(len(X))},
+                                   t.seconds, partition_keys(df).dropna().unique().tolist(), 'full', compiled=compiled,
+                                   through=last_day(df))
+    print("Trained model saved to", MODEL, "MAE:", mae, "version:", entry["id"])
+    return entry
+
+def train_incremental(df, target, trees=TREES_PER_PARTITION, workers=-1):
+    """Add `trees` trees per month with new rows to the current model, fitted on the new rows
+    pooled together plus HISTORY_RATIO times as many sampled older rows. Returns (entry, new_df)."""
+    current = model_registry.current_version(MODELS)
+    if current is None:
+        print("No registered model yet; running a full build.")
+        return train_full(df, target), df
+    new_mask = rows_after(df, current)
+    if not new_mask.any():
+        print(f"No rows after {current.get('through') or max(current['partitions'], default='-')};",
+              "model", current["id"], "is up to date.")
+        return None, df.iloc[:0]
+    new_df = df[new_mask]
+    new_parts = sorted(partition_keys(new_df).unique())
+    pipe = joblib.load(model_registry.artifact_path(MODELS, current, 'model'))
+    columns = current["features"]
+    X, y = build_features(new_df, target, columns)
+    if len(X) < 10:
+        print("Not enough new rows to train. Need at least 10 rows.")
+        return None, new_df
+
+    with model_registry.Timer() as t:
+        X_train, X_test, y_train, y_test = train_test_split(X,y,test_size=0.2, random_state=42)
+        mae_before = float((abs(pipe.predict(X_test) - y_test)).mean())
+        # trees fitted on one month alone are much weaker than the existing ones and drag the
+        # average down; a sample of the history keeps the new trees good on the old months too
+        old_df = df[~new_mask]
+        sample = old_df.sample(min(len(old_df), HISTORY_RATIO * len(X_train)), random_state=42)
+        hist_X, hist_y = build_features(sample, target, columns)
+        # imputer/scaler stay fixed so old and new trees see the same input transform
+        Xt = pipe[:-1].transform(pd.concat([X_train, hist_X]))
+        rf = pipe.named_steps['rf']
+        added = RandomForestRegressor(n_estimators=trees * len(new_parts), random_state=42 + len(rf.estimators_),
+                                      n_jobs=workers)
+        added.fit(Xt, np.concatenate([y_train.to_numpy(), hist_y.to_numpy()]))
+        rf.estimators_.extend(added.estimators_)
+        rf.n_estimators = len(rf.estimators_)
+    preds = pipe.predict(X_test)
+    mae = float((abs(preds - y_test)).mean())
+    # the grown forest only goes live if it does better on the new data than the current model
+    accepted = mae <= mae_before
+    compiled = export_compiled(pipe, X_test, preds)
+    if accepted:
+        save_current(pipe, columns, compiled)
+    entry = model_registry.publish(MODELS, pipe, columns,
+                                   {"mae": mae, "mae_before": mae_before, "rows": int(len(X))},
+                                   t.seconds, set(current["partitions"]) | set(new_parts), 'incremental',
+                                   parent=current["id"], compiled=compiled, make_current=accepted,
+                                   through=last_day(new_df))
+    print(f"Trained on {len(new_df)} new rows in {len(new_parts)} partitions ({rf.n_estimators} trees total)",
+          f"in {t.seconds:.2f}s;",
+          "MAE on new data:", mae_before, "->", mae, "version:", entry["id"])
+    if not accepted:
+        print(f"{entry['id']} is worse than {current['id']} on the new data and was not activated;",
+              f"keep serving {current['id']} or run a full build (activate anyway with model_registry.activate).")
+    return entry, new_df
+
+# ------------------------------
+# Database
+# ------------------------------
+def build_database(df):
+    # built in a staging file and swapped in by renaming tables, so the running app never sees a partial table
+    tables = {}
+    if 'date' in df.columns:
+        # aggregated monthly sales
+        agg = df.groupby([df['date'].dt.to_period('M')]).agg({'total':'sum','quantity':'sum'}).reset_index()
+        agg['month'] = agg['date'].astype(str)
+        tables['sales_by_month'] = agg[['month','total','quantity']]
+    stats = bulk_load.reload(DB, df, tables)
+    print("DB built at", DB, f"({stats['rows']} rows, {stats['rows_per_sec']:.0f} rows/s;",
+          f"stage {stats['stage_seconds']}s, copy {stats['copy_seconds']}s, swap {stats['swap_seconds']}s)")
+
+def append_new_rows(df):
+    """Insert the rows dated after the last day in the DB (dims and rollup follow via triggers)
+    and add them to their sales_by_month rows, including the month that was still open."""
+    conn = sqlite3.connect(DB)
+    try:
+        last = conn.execute("SELECT MAX(date_id) FROM dim_date").fetchone()[0]
+    except sqlite3.OperationalError:
+        conn.close()
+        print("No dated star schema in", DB, "; run a full build.")
+        return
+    rows = df[df['date'].notna()]
+    if last is not None:
+        rows = rows[rows['date'].dt.strftime('%Y%m%d').astype(int) > last]
+    if len(rows):
+        cols = list(rows.columns)
+        data = rows.astype(object).where(rows.notna(), None)
+        data['date'] = rows['date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        agg = rows.groupby(partition_keys(rows)).agg({'total':'sum','quantity':'sum'})
+        with conn:
+            conn.executemany(f"INSERT INTO supermart_raw ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                             data.itertuples(index=False, name=None))
+            for month, r in agg.iterrows():
+                added = (float(r.total), float(r.quantity), month)
+                if conn.execute("UPDATE sales_by_month SET total = total + ?, quantity = quantity + ? WHERE month = ?",
+                                added).rowcount == 0:
+                    conn.execute("INSERT INTO sales_by_month (total, quantity, month) VALUES (?,?,?)", added)
+    conn.close()
+    print(f"Appended {len(rows)} rows after {last or 'an empty DB'} to", DB)
+
+def main(argv):
+    df = load_dataset()
+    target = choose_target(df)
+    if '--incremental' in argv and os.path.exists(DB):
+        opt = lambda name, default: int(argv[argv.index(name) + 1]) if name in argv else default
+        entry, _ = train_incremental(df, target, opt('--trees', TREES_PER_PARTITION), opt('--workers', -1))
+        if entry is not None and entry["mode"] == 'full':
+            build_database(df)
+        else:
+            # independent of the model: rows are appended even when its new version is not activated
+            append_new_rows(df)
+    else:
+        train_full(df, target)
+        build_database(df)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
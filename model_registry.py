@@ -0,0 +1,92 @@
+# model_registry.py
+# Versioned model artifacts under models/:
+#   models/registry.json            {"current": "v0002", "versions": [...]}
+#   models/v0002/model.pkl          sklearn Pipeline
+#   models/v0002/feature_columns.json
+#   models/v0002/compiled.npz       optional compiled forest
+# Publishing writes the version directory first and then swaps registry.json with
+# os.replace, so readers switch to a new version atomically.
+import os, json, time, datetime
+
+REGISTRY_FILE = 'registry.json'
+ARTIFACTS = {'model': 'model.pkl', 'features': 'feature_columns.json', 'compiled': 'compiled.npz'}
+
+
+def load_registry(root):
+    path = os.path.join(root, REGISTRY_FILE)
+    if not os.path.exists(path):
+        return {"current": None, "versions": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_registry(root, reg):
+    tmp = os.path.join(root, REGISTRY_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(reg, f, indent=2)
+    os.replace(tmp, os.path.join(root, REGISTRY_FILE))
+
+
+def current_version(root):
+    reg = load_registry(root)
+    for v in reg["versions"]:
+        if v["id"] == reg["current"]:
+            return v
+    return None
+
+
+def artifact_path(root, version, artifact):
+    return os.path.join(root, version["id"], ARTIFACTS[artifact])
+
+
+def publish(root, pipe, columns, metrics, train_seconds, partitions, mode, parent=None, compiled=None,
+            make_current=True, through=None):
+    """Write a new model version and (by default) make it current. `through` is the last day
+    (YYYY-MM-DD) of the training data. Returns the version entry."""
+    import joblib
+    os.makedirs(root, exist_ok=True)
+    reg = load_registry(root)
+    vid = "v%04d" % (len(reg["versions"]) + 1)
+    vdir = os.path.join(root, vid)
+    os.makedirs(vdir, exist_ok=True)
+    joblib.dump(pipe, os.path.join(vdir, ARTIFACTS['model']))
+    with open(os.path.join(vdir, ARTIFACTS['features']), 'w') as f:
+        json.dump(list(columns), f, indent=2)
+    if compiled is not None:
+        compiled.save(os.path.join(vdir, ARTIFACTS['compiled']))
+    entry = {
+        "id": vid,
+        "created": datetime.datetime.utcnow().isoformat(),
+        "mode": mode,
+        "parent": parent,
+        "n_estimators": len(pipe.named_steps['rf'].estimators_),
+        "features": list(columns),
+        "metrics": metrics,
+        "train_seconds": round(train_seconds, 3),
+        "partitions": sorted(partitions),
+        "through": through,
+        "compiled": compiled is not None,
+    }
+    reg["versions"].append(entry)
+    if make_current:
+        reg["current"] = vid
+    _write_registry(root, reg)
+    return entry
+
+
+def activate(root, vid):
+    """Point the registry at an existing version (rollback / pinning)."""
+    reg = load_registry(root)
+    if not any(v["id"] == vid for v in reg["versions"]):
+        raise ValueError(f"Unknown model version {vid}")
+    reg["current"] = vid
+    _write_registry(root, reg)
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
@@ -0,0 +1,197 @@
+# result_cache.py
+# Caches for repeated /predict inputs and /filter_data queries.
+#
+#   SUPERMART_CACHE=0                  disable (every lookup misses, nothing is stored)
+#   SUPERMART_CACHE_SIZE=2048          entries per cache and process
+#   SUPERMART_CACHE_TTL=300            seconds an entry stays valid
+#   SUPERMART_CACHE_SHARED=path.db     optional SQLite file shared by all workers on the host
+#   SUPERMART_CACHE_CHECK_SECONDS=1    how often the data version is re-read from the DB
+#
+# Every entry is stored with the version it was computed against (model stamp, or data
+# version of supermart_raw). A lookup with a different version is a miss, so publishing a
+# model or loading data invalidates old results without any explicit flush. Values kept in
+# the shared tier must be JSON-serialisable.
+import os, json, time, sqlite3, threading
+from collections import OrderedDict
+
+ENABLED = os.environ.get('SUPERMART_CACHE', '1') not in ('0', 'false', 'no', '')
+MAX_SIZE = int(os.environ.get('SUPERMART_CACHE_SIZE', '2048'))
+TTL = float(os.environ.get('SUPERMART_CACHE_TTL', '300'))
+SHARED_PATH = os.environ.get('SUPERMART_CACHE_SHARED') or None
+CHECK_SECONDS = float(os.environ.get('SUPERMART_CACHE_CHECK_SECONDS', '1'))
+
+MISS = object()
+STATS = ('hits', 'shared_hits', 'misses', 'stale', 'expired', 'evictions', 'stores')
+
+
+class SharedTier:
+    """Results in a small SQLite table so a value computed by one worker is reused by the others."""
+
+    PRUNE_EVERY = 500   # puts between deletions of expired rows
+
+    def __init__(self, path):
+        self.path = path
+        self._reset()
+        if hasattr(os, 'register_at_fork'):   # POSIX only
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # SQLite connections must not cross fork; each process opens its own
+        self._conn = None
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")   # a lost entry is only a miss
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS result_cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    expires REAL NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                ) WITHOUT ROWID
+            """)
+            self._conn = conn
+        return self._conn
+
+    def get(self, namespace, key, version):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM result_cache WHERE namespace=? AND key=? AND version=? AND expires>?",
+                (namespace, key, version, time.time())).fetchone()
+        return MISS if row is None else json.loads(row[0])
+
+    def put(self, namespace, key, version, value, ttl):
+        data = json.dumps(value, separators=(',', ':'))
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO result_cache VALUES (?,?,?,?,?)",
+                         (namespace, key, version, time.time() + ttl, data))
+            self._puts += 1
+            if self._puts % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM result_cache WHERE expires<=?", (time.time(),))
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a TTL whose entries are tagged with a version.
+
+    `get(key, version)` returns MISS for absent, expired or other-version entries. With a
+    SharedTier, local misses are looked up there and every put is written through.
+    """
+
+    def __init__(self, name, maxsize=MAX_SIZE, ttl=TTL, shared=None, enabled=ENABLED):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self.enabled = enabled and maxsize > 0
+        self._entries = OrderedDict()   # key -> (version, expires, value)
+        self._reset_lock()
+        self.reset_stats()
+        if hasattr(os, 'register_at_fork'):   # POSIX only
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def reset_stats(self):
+        for s in STATS:
+            setattr(self, s, 0)
+
+    def get(self, key, version):
+        if not self.enabled:
+            return MISS
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == version and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                del self._entries[key]
+                if entry[0] != version:
+                    self.stale += 1
+                else:
+                    self.expired += 1
+        if self.shared is not None:
+            try:
+                value = self.shared.get(self.name, str(key), str(version))
+            except sqlite3.Error as e:
+                print("Shared cache read failed:", e)
+                value = MISS
+            if value is not MISS:
+                self._store(key, version, value)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return MISS
+
+    def _store(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def put(self, key, version, value):
+        if not self.enabled:
+            return
+        self._store(key, version, value)
+        with self._lock:
+            self.stores += 1
+        if self.shared is not None:
+            try:
+                self.shared.put(self.name, str(key), str(version), value, self.ttl)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                print("Shared cache write failed:", e)
+
+    def get_or_compute(self, key, version, compute):
+        """Cached value for (key, version), else `compute()`, which is stored and returned."""
+        value = self.get(key, version)
+        if value is MISS:
+            value = compute()
+            self.put(key, version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            out = {s: getattr(self, s) for s in STATS}
+            out['size'] = len(self._entries)
+        lookups = out['hits'] + out['shared_hits'] + out['misses']
+        out['hit_ratio'] = round((out['hits'] + out['shared_hits']) / lookups, 4) if lookups else 0.0
+        out.update(maxsize=self.maxsize, ttl=self.ttl, enabled=self.enabled, shared=self.shared is not None)
+        return out
+
+
+class VersionProbe:
+    """Remembers the result of `read()` for `interval` seconds, so a cache hit does not have to
+    query the database for its version on every request."""
+
+    def __init__(self, read, interval=CHECK_SECONDS):
+        self.read = read
+        self.interval = interval
+        self._value = None
+        self._checked = None
+
+    def __call__(self):
+        now = time.monotonic()
+        if self._checked is None or now - self._checked >= self.interval:
+            self._value = self.read()
+            self._checked = now
+        return self._value
+
+    def invalidate(self):
+        self._checked = None
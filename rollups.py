@@ -0,0 +1,164 @@
+# rollups.py
+# Store x product x month aggregates of supermart_raw (the fact_sales star schema), kept
+# current by triggers so the SQL explorer reads a few hundred groups instead of scanning
+# every transaction.
+import db
+
+ROLLUP = 'sales_rollup'
+
+_KEY = ("IFNULL((SELECT store_location FROM dim_store WHERE store_id={r}.store_id),'')",
+        "IFNULL((SELECT product FROM dim_product WHERE product_id={r}.product_id),'')",
+        "IFNULL({r}.date_id/10000,0)",
+        "IFNULL({r}.date_id/100%100,0)")
+
+def _key(ref):
+    return ", ".join(k.format(r=ref) for k in _KEY)
+
+CREATE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {ROLLUP} (
+    store_location TEXT NOT NULL,
+    product TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    rows INTEGER NOT NULL DEFAULT 0,
+    total_sum REAL NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    quantity_sum REAL NOT NULL DEFAULT 0,
+    unit_price_sum REAL NOT NULL DEFAULT 0,
+    unit_price_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (store_location, product, year, month)
+) WITHOUT ROWID;
+"""
+
+TRIGGERS_SQL = f"""
+CREATE TRIGGER IF NOT EXISTS {ROLLUP}_ins AFTER INSERT ON fact_sales BEGIN
+    INSERT INTO {ROLLUP} (store_location, product, year, month, rows, total_sum, total_count,
+                          quantity_sum, unit_price_sum, unit_price_count)
+    VALUES ({_key('NEW')}, 1, IFNULL(NEW.total,0), NEW.total IS NOT NULL,
+            IFNULL(NEW.quantity,0), IFNULL(NEW.unit_price,0), NEW.unit_price IS NOT NULL)
+    ON CONFLICT (store_location, product, year, month) DO UPDATE SET
+        rows = rows + 1,
+        total_sum = total_sum + excluded.total_sum,
+        total_count = total_count + excluded.total_count,
+        quantity_sum = quantity_sum + excluded.quantity_sum,
+        unit_price_sum = unit_price_sum + excluded.unit_price_sum,
+        unit_price_count = unit_price_count + excluded.unit_price_count;
+END;
+CREATE TRIGGER IF NOT EXISTS {ROLLUP}_del AFTER DELETE ON fact_sales BEGIN
+    UPDATE {ROLLUP} SET
+        rows = rows - 1,
+        total_sum = total_sum - IFNULL(OLD.total,0),
+        total_count = total_count - (OLD.total IS NOT NULL),
+        quantity_sum = quantity_sum - IFNULL(OLD.quantity,0),
+        unit_price_sum = unit_price_sum - IFNULL(OLD.unit_price,0),
+        unit_price_count = unit_price_count - (OLD.unit_price IS NOT NULL)
+    WHERE (store_location, product, year, month) = ({_key('OLD')});
+    DELETE FROM {ROLLUP} WHERE rows <= 0;
+END;
+"""
+
+def populate_rollups(conn):
+    """Rebuild the rollup and its triggers inside the caller's transaction."""
+    conn.execute(f"DROP TABLE IF EXISTS {ROLLUP}")
+    conn.execute(CREATE_SQL)
+    conn.execute(f"""
+        INSERT INTO {ROLLUP}
+        SELECT IFNULL(st.store_location,''), IFNULL(p.product,''),
+               IFNULL(r.date_id/10000,0), IFNULL(r.date_id/100%100,0),
+               COUNT(*), IFNULL(SUM(r.total),0), COUNT(r.total),
+               IFNULL(SUM(r.quantity),0), IFNULL(SUM(r.unit_price),0), COUNT(r.unit_price)
+        FROM fact_sales r
+        LEFT JOIN dim_store st ON st.store_id = r.store_id
+        LEFT JOIN dim_product p ON p.product_id = r.product_id
+        GROUP BY 1, 2, 3, 4
+    """)
+    for name in (ROLLUP + '_ins', ROLLUP + '_del'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for stmt in TRIGGERS_SQL.split("END;")[:-1]:
+        conn.execute(stmt + "END;")
+
+def build_rollups(conn):
+    """(Re)build the rollup from fact_sales and install the incremental triggers."""
+    with conn:
+        populate_rollups(conn)
+
+def ensure_rollups(conn):
+    """Build the rollup once for databases created before it existed."""
+    has = lambda kind, name: conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type=? AND name=?", (kind, name)).fetchone() is not None
+    if not has('table', 'fact_sales'):
+        return False
+    if not (has('table', ROLLUP) and has('trigger', ROLLUP + '_ins')):
+        build_rollups(conn)
+    return True
+
+# ------------------------------
+# Queries used by the SQL explorer
+# ------------------------------
+STORE_SALES_SQL = f"""
+    SELECT NULLIF(store_location,'') AS Store, ROUND(SUM(total_sum),2) AS Total_Sales
+    FROM {ROLLUP}
+    GROUP BY store_location
+    ORDER BY Total_Sales DESC LIMIT 20;
+"""
+
+MONTHLY_SALES_SQL = f"""
+    SELECT printf('%04d', year) AS Year, printf('%02d', month) AS Month,
+           ROUND(SUM(total_sum),2) AS Total_Sales
+    FROM {ROLLUP}
+    WHERE year > 0
+    GROUP BY year, month
+    ORDER BY Year DESC, Month ASC;
+"""
+
+TOP_PRODUCTS_SQL = f"""
+    SELECT NULLIF(product,'') AS Product, ROUND(SUM(total_sum),2) AS Total_Sales, SUM(quantity_sum) AS Total_Quantity
+    FROM {ROLLUP}
+    GROUP BY product
+    ORDER BY Total_Sales DESC LIMIT 15;
+"""
+
+STORE_UNIT_PRICE_SQL = f"""
+    SELECT NULLIF(store_location,'') AS Store,
+           ROUND(SUM(unit_price_sum) / NULLIF(SUM(unit_price_count),0),2) AS Avg_Unit_Price
+    FROM {ROLLUP}
+    GROUP BY store_location
+    ORDER BY Avg_Unit_Price DESC LIMIT 15;
+"""
+
+def kpis(conn, year=None, product=None, store=None):
+    """KPI block for /filter_data, answered from the rollup (from a plain supermart_raw
+    table, which has none, by scanning it)."""
+    if db.raw_is_plain(conn):
+        return _plain_kpis(conn, year, product, store)
+    where = ["1=1"]; params = []
+    if year:
+        try:
+            params.append(int(year)); where.append("year=?")
+        except (TypeError, ValueError):
+            where.append("0")   # not a year: no rows, like the raw-table filter
+    if product:
+        where.append("product=?"); params.append(product)
+    if store:
+        where.append("store_location=?"); params.append(store)
+    total_sales, total_items, transactions, avg_bill = conn.execute(f"""
+        SELECT CASE WHEN SUM(total_count) > 0 THEN SUM(total_sum) END,
+               CASE WHEN SUM(rows) > 0 THEN SUM(quantity_sum) END,
+               IFNULL(SUM(rows),0),
+               SUM(total_sum) / NULLIF(SUM(total_count),0)
+        FROM {ROLLUP} WHERE {' AND '.join(where)};
+    """, params).fetchone()
+    return {"total_sales": total_sales, "total_items": total_items,
+            "transactions": transactions, "avg_bill": avg_bill}
+
+def _plain_kpis(conn, year, product, store):
+    cols = db.raw_columns(conn)
+    where_sql, params = db.raw_filter(year, product, store, cols)
+    total = "total" if 'total' in cols else "NULL"
+    quantity = "quantity" if 'quantity' in cols else "NULL"
+    total_sales, total_items, transactions, avg_bill = conn.execute(f"""
+        SELECT SUM({total}), CASE WHEN COUNT(*) > 0 THEN TOTAL({quantity}) END, COUNT(*), AVG({total})
+        FROM supermart_raw WHERE {where_sql};
+    """, params).fetchone()
+    return {"total_sales": total_sales, "total_items": total_items,
+            "transactions": transactions, "avg_bill": avg_bill}
@@ -0,0 +1,117 @@
+# snapshot.py
+# Typed columnar snapshot of the cleaned dataset: one raw little-endian column file per
+# column plus meta.json. Text columns are dictionary-encoded (int32 codes, -1 = missing),
+# dates are int64 epoch seconds, numbers are float64 (NaN = missing). Loading memory-maps the
+# files, so readers share the OS page cache and nothing is parsed from text.
+import os, json, shutil
+import numpy as np
+import pandas as pd
+
+META = 'meta.json'
+
+
+class SnapshotWriter:
+    """Appends DataFrame chunks to a snapshot directory; call close() to publish it."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp = path + '.tmp'
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self.columns = None   # name -> {'kind', 'dtype'}
+        self.dicts = {}       # name -> {value: code}
+        self.rows = 0
+        self._files = {}
+
+    def _kind(self, s):
+        if pd.api.types.is_datetime64_any_dtype(s):
+            return 'date', '<i8'
+        if pd.api.types.is_numeric_dtype(s):
+            return 'number', '<f8'
+        return 'dict', '<i4'
+
+    def append(self, df):
+        if self.columns is None:
+            self.columns = {}
+            for c in df.columns:
+                kind, dtype = self._kind(df[c])
+                self.columns[c] = {'kind': kind, 'dtype': dtype}
+                self._files[c] = open(os.path.join(self.tmp, c + '.bin'), 'wb')
+                if kind == 'dict':
+                    self.dicts[c] = {}
+        for c, spec in self.columns.items():
+            s = df[c]
+            if spec['kind'] == 'date':
+                v = s.to_numpy(dtype='datetime64[s]').view('<i8')
+            elif spec['kind'] == 'dict':
+                d = self.dicts[c]
+                codes, uniques = pd.factorize(s, use_na_sentinel=True)
+                remap = np.array([d.setdefault(str(u), len(d)) for u in uniques] + [-1], dtype='<i4')
+                v = remap[codes]  # sentinel -1 indexes the trailing -1
+            else:
+                v = pd.to_numeric(s, errors='coerce').to_numpy(dtype='<f8', na_value=np.nan)
+            self._files[c].write(np.ascontiguousarray(v, dtype=spec['dtype']).tobytes())
+        self.rows += len(df)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        meta = {'rows': self.rows, 'columns': self.columns or {},
+                'dictionaries': {c: list(d) for c, d in self.dicts.items()}}
+        with open(os.path.join(self.tmp, META), 'w') as f:
+            json.dump(meta, f)
+        old = self.path + '.old'
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.replace(self.path, old)
+        os.replace(self.tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def write_snapshot(df, path):
+    w = SnapshotWriter(path)
+    w.append(df)
+    w.close()
+
+
+class Snapshot:
+    """Memory-mapped view of a snapshot directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META)) as f:
+            meta = json.load(f)
+        self.rows = meta['rows']
+        self.columns = meta['columns']
+        self.dictionaries = meta['dictionaries']
+
+    def array(self, name):
+        """Raw column array (memory-mapped; codes for dictionary columns)."""
+        spec = self.columns[name]
+        if self.rows == 0:
+            return np.empty(0, dtype=spec['dtype'])
+        return np.memmap(os.path.join(self.path, name + '.bin'), dtype=spec['dtype'], mode='r', shape=(self.rows,))
+
+    def series(self, name):
+        spec = self.columns[name]
+        a = self.array(name)
+        if spec['kind'] == 'date':
+            # int64 seconds reinterpreted in place; NaT is int64 min, same bit pattern
+            return pd.Series(a.view('datetime64[s]'), name=name, copy=False)
+        if spec['kind'] == 'dict':
+            cats = pd.Index(self.dictionaries[name], dtype=object)
+            return pd.Series(pd.Categorical.from_codes(a, categories=cats, validate=False), name=name)
+        return pd.Series(a, name=name, copy=False)
+
+    def to_frame(self, columns=None):
+        cols = columns or list(self.columns)
+        return pd.DataFrame({c: self.series(c) for c in cols}, copy=False)
+
+
+def load_snapshot(path):
+    if os.path.exists(os.path.join(path, META)):
+        try:
+            return Snapshot(path)
+        except Exception as e:
+            print("Snapshot load failed:", e)
+    return None
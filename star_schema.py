@@ -0,0 +1,148 @@
+# star_schema.py
+# supermart_raw as a star schema: integer-keyed dimensions for product, store and calendar,
+# a narrow fact table, and views that present the old wide layout.
+#
+#   dim_product(product_id, product)        dim_store(store_id, store_location)
+#   dim_date(date_id = YYYYMMDD, date, year, month, day)
+#   fact_sales(date_id, store_id, product_id, <measures and any other columns>)
+#   supermart_raw_keyed  view: fact rowid + surrogate keys + the original columns
+#   supermart_raw        view: exactly the original columns, for existing queries
+#
+# dim_date has one row per calendar day, so a time of day in the source date column is not
+# kept: supermart_raw.date reads back as 'YYYY-MM-DD 00:00:00'. build_star warns when it
+# drops one. Sources without date/product/store_location are loaded as a plain table.
+
+DIMENSION_COLUMNS = ('date', 'store_location', 'product')
+FACT = 'fact_sales'
+TABLES = ('dim_product', 'dim_store', 'dim_date', FACT)
+KEYED_VIEW = 'supermart_raw_keyed'
+VIEW = 'supermart_raw'
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _split(source):
+    """('schema', 'table') for 'schema.table', ('main', 'table') otherwise."""
+    schema, _, table = source.rpartition('.')
+    return schema or 'main', table
+
+def is_star(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FACT,)).fetchone() is not None
+
+def drop_star(conn):
+    for kind, name in [('VIEW', VIEW), ('VIEW', KEYED_VIEW), ('TABLE', FACT),
+                       ('TABLE', 'dim_product'), ('TABLE', 'dim_store'), ('TABLE', 'dim_date')]:
+        conn.execute(f"DROP {kind} IF EXISTS {name}")
+
+def missing_columns(conn, source):
+    """Dimension columns the wide table `source` lacks (build_star needs all of them)."""
+    schema, table = _split(source)
+    cols = [r[1] for r in conn.execute(f"PRAGMA {_q(schema)}.table_info({_q(table)})")]
+    return [c for c in DIMENSION_COLUMNS if c not in cols]
+
+def build_star(conn, source):
+    """Build the dimensions, fact table and compatibility views from the wide table `source`
+    (optionally schema-qualified, e.g. an attached staging database).
+
+    Runs inside the caller's transaction; `source` is left in place. Dates are truncated to
+    the day (see the module header).
+    """
+    schema, table = _split(source)
+    info = conn.execute(f"PRAGMA {_q(schema)}.table_info({_q(table)})").fetchall()
+    cols = [r[1] for r in info]
+    types = {r[1]: r[2] for r in info}
+    missing = [c for c in DIMENSION_COLUMNS if c not in cols]
+    if missing:
+        raise ValueError(f"{source} is missing dimension columns: {missing}")
+    measures = [c for c in cols if c not in DIMENSION_COLUMNS]
+    src = f"{_q(schema)}.{_q(table)}"
+    if conn.execute(f"SELECT 1 FROM {src} WHERE time(date) <> '00:00:00' LIMIT 1").fetchone():
+        print(f"Note: {source}.date has times of day; the star schema keeps only the date.")
+
+    drop_star(conn)
+    conn.execute("CREATE TABLE dim_product (product_id INTEGER PRIMARY KEY, product TEXT NOT NULL UNIQUE)")
+    conn.execute("CREATE TABLE dim_store (store_id INTEGER PRIMARY KEY, store_location TEXT NOT NULL UNIQUE)")
+    conn.execute("""CREATE TABLE dim_date (date_id INTEGER PRIMARY KEY, date TEXT NOT NULL,
+                    year INTEGER NOT NULL, month INTEGER NOT NULL, day INTEGER NOT NULL)""")
+    conn.execute(f"INSERT INTO dim_product (product) SELECT DISTINCT product FROM {src} WHERE product IS NOT NULL ORDER BY product")
+    conn.execute(f"INSERT INTO dim_store (store_location) SELECT DISTINCT store_location FROM {src} WHERE store_location IS NOT NULL ORDER BY store_location")
+    conn.execute(f"""
+        INSERT OR IGNORE INTO dim_date (date_id, date, year, month, day)
+        SELECT DISTINCT CAST(strftime('%Y%m%d', date) AS INTEGER), strftime('%Y-%m-%d 00:00:00', date),
+               CAST(strftime('%Y', date) AS INTEGER), CAST(strftime('%m', date) AS INTEGER), CAST(strftime('%d', date) AS INTEGER)
+        FROM {src} WHERE strftime('%Y%m%d', date) IS NOT NULL ORDER BY 1
+    """)
+
+    measure_ddl = "".join(f", {_q(c)} {types[c]}" for c in measures)
+    conn.execute(f"CREATE TABLE {FACT} (date_id INTEGER, store_id INTEGER, product_id INTEGER{measure_ddl})")
+    measure_sel = "".join(f", s.{_q(c)}" for c in measures)
+    conn.execute(f"""
+        INSERT INTO {FACT}
+        SELECT CAST(strftime('%Y%m%d', s.date) AS INTEGER), st.store_id, p.product_id{measure_sel}
+        FROM {src} s
+        LEFT JOIN dim_store st ON st.store_location = s.store_location
+        LEFT JOIN dim_product p ON p.product = s.product
+        ORDER BY s.rowid
+    """)
+
+    wide = {'date': 'd.date', 'store_location': 'st.store_location', 'product': 'p.product'}
+    wide.update({c: f"f.{_q(c)}" for c in measures})
+    conn.execute(f"""
+        CREATE VIEW {KEYED_VIEW} AS
+        SELECT f.rowid AS fact_rowid, f.date_id, f.store_id, f.product_id,
+               {', '.join(f'{wide[c]} AS {_q(c)}' for c in cols)}
+        FROM {FACT} f
+        LEFT JOIN dim_date d ON d.date_id = f.date_id
+        LEFT JOIN dim_store st ON st.store_id = f.store_id
+        LEFT JOIN dim_product p ON p.product_id = f.product_id
+    """)
+    conn.execute(f"CREATE VIEW {VIEW} AS SELECT {', '.join(_q(c) for c in cols)} FROM {KEYED_VIEW}")
+
+    # Inserts through the old table name still land in the star schema
+    conn.execute(f"""
+        CREATE TRIGGER {VIEW}_insert INSTEAD OF INSERT ON {VIEW} BEGIN
+            INSERT OR IGNORE INTO dim_product (product) SELECT NEW.product WHERE NEW.product IS NOT NULL;
+            INSERT OR IGNORE INTO dim_store (store_location) SELECT NEW.store_location WHERE NEW.store_location IS NOT NULL;
+            INSERT OR IGNORE INTO dim_date (date_id, date, year, month, day)
+                SELECT CAST(strftime('%Y%m%d', NEW.date) AS INTEGER), strftime('%Y-%m-%d 00:00:00', NEW.date),
+                       CAST(strftime('%Y', NEW.date) AS INTEGER), CAST(strftime('%m', NEW.date) AS INTEGER),
+                       CAST(strftime('%d', NEW.date) AS INTEGER)
+                WHERE strftime('%Y%m%d', NEW.date) IS NOT NULL;
+            INSERT INTO {FACT} (date_id, store_id, product_id{''.join(', ' + _q(c) for c in measures)})
+            VALUES (CAST(strftime('%Y%m%d', NEW.date) AS INTEGER),
+                    (SELECT store_id FROM dim_store WHERE store_location = NEW.store_location),
+                    (SELECT product_id FROM dim_product WHERE product = NEW.product)
+                    {''.join(', NEW.' + _q(c) for c in measures)});
+        END
+    """)
+
+def migrate_wide_table(conn):
+    """Convert a pre-star supermart_raw table in place. Returns True if it migrated."""
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name=?", (VIEW,)).fetchone()
+    if row is None or row[0] != 'table' or missing_columns(conn, VIEW):
+        return False
+    with conn:
+        conn.execute(f"ALTER TABLE {VIEW} RENAME TO supermart_raw_wide")
+        build_star(conn, 'supermart_raw_wide')
+        conn.execute("DROP TABLE supermart_raw_wide")
+    conn.execute("VACUUM")
+    return True
+
+def dimension_values(conn):
+    """(stores, products) straight from the dimension tables (distinct values of a plain
+    supermart_raw table, which has none)."""
+    if not is_star(conn):
+        cols = [r[1] for r in conn.execute(f"PRAGMA table_info({VIEW})")]
+        distinct = lambda c: [r[0] for r in conn.execute(
+            f"SELECT DISTINCT {_q(c)} FROM {VIEW} WHERE {_q(c)} IS NOT NULL ORDER BY 1")] if c in cols else []
+        return distinct('store_location'), distinct('product')
+    stores = [r[0] for r in conn.execute("SELECT store_location FROM dim_store ORDER BY store_id")]
+    products = [r[0] for r in conn.execute("SELECT product FROM dim_product ORDER BY product_id")]
+    return stores, products
+
+def dimension_version(conn):
+    """Cheap change marker for the append-only dimensions (max surrogate keys; newest row of
+    a plain supermart_raw table)."""
+    if not is_star(conn):
+        return conn.execute(f"SELECT MAX(rowid) FROM {VIEW}").fetchone()
+    return conn.execute("SELECT (SELECT MAX(store_id) FROM dim_store), (SELECT MAX(product_id) FROM dim_product)").fetchone()
@@ -0,0 +1,25 @@
+import sqlite3
+import bulk_load
+from test_query_plans import sample_frame
+
+
+def test_reload_keeps_unrelated_tables(tmp_path):
+    path = str(tmp_path / 'supermart.db')
+    bulk_load.reload(path, sample_frame(50))
+    conn = sqlite3.connect(path)
+    with conn:
+        # names that end in load / old, but not in the loader's __load / __old suffixes
+        for name in ('threshold', 'upload', 'x_old'):
+            conn.execute(f"CREATE TABLE {name} (v INTEGER)")
+            conn.execute(f"INSERT INTO {name} VALUES (1)")
+        conn.execute("CREATE TABLE fact_sales__old (v INTEGER)")   # left by an interrupted load
+    conn.close()
+
+    stats = bulk_load.reload(path, sample_frame(60))
+    assert stats['rows'] == 300
+    conn = sqlite3.connect(path)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    assert {'threshold', 'upload', 'x_old'} <= tables
+    assert not [t for t in tables if t.endswith(('__load', '__old'))]
+    assert conn.execute("SELECT COUNT(*) FROM supermart_raw").fetchone()[0] == 300
+    conn.close()
@@ -0,0 +1,38 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import bulk_load, db, rollups
+
+
+def sample_frame(days=800):
+    rng = np.random.default_rng(0)
+    n = days * 5
+    quantity = rng.integers(1, 20, n)
+    unit_price = np.round(rng.uniform(0.5, 10, n), 2)
+    return pd.DataFrame({
+        'date': np.repeat(pd.date_range('2022-01-01', periods=days), 5),
+        'store_location': rng.choice(['Downtown', 'Mall', 'Uptown'], n),
+        'product': rng.choice(['Milk', 'Bread', 'Eggs', 'Rice'], n),
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'total': np.round(quantity * unit_price, 2),
+    })
+
+
+def test_filters_use_indexes(tmp_path):
+    path = str(tmp_path / 'supermart.db')
+    stats = bulk_load.reload(path, sample_frame())
+    assert stats['rows'] == 4000
+    conn = sqlite3.connect(path)
+    db.check_query_plans(conn)   # raises on a full scan
+    conn.close()
+
+
+def test_invalid_year_matches_nothing(tmp_path):
+    path = str(tmp_path / 'supermart.db')
+    bulk_load.reload(path, sample_frame(50))
+    conn = sqlite3.connect(path)
+    where_sql, params = db.raw_filter('20x2', 'Milk', '')
+    assert conn.execute(db.raw_select_sql(conn, where_sql), params).fetchall() == []
+    assert rollups.kpis(conn, '20x2', 'Milk', '')['transactions'] == 0
+    conn.close()
@@ -0,0 +1,23 @@
+import pytest
+import eda_and_prepare as eda
+
+
+def write_csv(path, dates):
+    rows = ["Order Date,Product,Store Location,Quantity,Unit Price,Total"]
+    rows += [f"{d},Milk,Mall,{i + 1},2.50,{(i + 1) * 2.5:.2f}" for i, d in enumerate(dates)]
+    path.write_text("\n".join(rows) + "\n")
+
+
+def test_dates_in_sample_format(tmp_path):
+    # month-first dates, as in the Supermart CSV
+    csv = tmp_path / 'in.csv'
+    write_csv(csv, ['11-08-2017', '06-12-2017', '10-11-2016', '12-31-2018'])
+    aggs = eda.stream_clean(str(csv), str(tmp_path / 'out.csv'), chunksize=2, snapshot=None)
+    assert aggs.by_month.index.astype(str).tolist() == ['2016-10', '2017-06', '2017-11', '2018-12']
+
+
+def test_unparseable_chunk_fails(tmp_path):
+    csv = tmp_path / 'in.csv'
+    write_csv(csv, ['2017-11-08', '2017-06-12', '08/11/2017', '12/06/2017'])
+    with pytest.raises(ValueError, match='order_date'):
+        eda.stream_clean(str(csv), str(tmp_path / 'out.csv'), chunksize=2, snapshot=None)
@@ -0,0 +1,156 @@
+# write_behind.py
+import os, time, queue, threading, atexit
+
+PREDICTION_INSERT_SQL = """
+    INSERT INTO predictions (timestamp, product, store_location, date, year, quantity, unit_price, predicted_total)
+    VALUES (?,?,?,?,?,?,?,?)
+"""
+
+
+class WriteBehindQueue:
+    """Buffers rows in memory and writes them with executemany in one transaction.
+
+    A background thread flushes whenever `batch_size` rows are waiting or `interval_ms`
+    has passed since the first unflushed row. A batch whose write fails (e.g. the database
+    is locked by a bulk load) is kept and retried first, with backoff from `retry_ms` up to
+    `max_retry_ms`; new rows wait in the queue meanwhile. The queue is bounded: `put`
+    blocks for at most `block_ms` when it is full and then drops the row, counting it as
+    dropped, so rows are only lost under queue pressure (or if still unwritten at exit).
+
+    The thread starts on the first `put`; a forked child (prefork server worker) gets a
+    fresh, empty queue and starts its own thread, since threads do not survive fork.
+    """
+
+    def __init__(self, pool, sql, batch_size=200, interval_ms=250, max_queue=10000, block_ms=50,
+                 retry_ms=100, max_retry_ms=5000):
+        self.pool = pool
+        self.sql = sql
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000.0
+        self.block = block_ms / 1000.0
+        self.max_queue = max_queue
+        self.retry = retry_ms / 1000.0
+        self.max_retry = max_retry_ms / 1000.0
+        self._reset()
+        atexit.register(self.close)
+        if hasattr(os, 'register_at_fork'):   # POSIX only
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._q = queue.Queue(maxsize=self.max_queue)
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self.queued = self.flushed = self.dropped = self.flushes = self.errors = self.retries = 0
+        self._failed = []      # rows of the last failed write, retried before anything newer
+        self._backoff = 0.0
+        self._thread = None
+
+    def _ensure_thread(self):
+        with self._start_lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+
+    def put(self, row):
+        """Enqueue one row; returns False if it had to be dropped."""
+        ok = False
+        if self._thread is None:
+            self._ensure_thread()
+        if not self._stop.is_set():
+            try:
+                self._q.put(row, timeout=self.block)
+                ok = True
+            except queue.Full:
+                pass
+        with self._count_lock:
+            if ok:
+                self.queued += 1
+            else:
+                self.dropped += 1
+        return ok
+
+    def _drain(self, first, deadline):
+        batch = [first]
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Write `batch` (called under _flush_lock). On failure the rows are kept in
+        _failed for the next attempt; returns whether the write succeeded."""
+        try:
+            with self.pool.connection() as conn, conn:
+                conn.executemany(self.sql, batch)
+        except Exception as e:
+            print("Write-behind flush failed, will retry:", e)
+            self._failed = batch
+            self._backoff = min(max(self._backoff * 2, self.retry), self.max_retry)
+            with self._count_lock:
+                self.errors += 1
+            return False
+        self._failed = []
+        self._backoff = 0.0
+        with self._count_lock:
+            self.flushed += len(batch)
+            self.flushes += 1
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._failed:
+                if self._stop.wait(self._backoff):
+                    break
+                with self._flush_lock:
+                    if self._failed:
+                        with self._count_lock:
+                            self.retries += 1
+                        self._write(self._failed)
+                continue
+            try:
+                first = self._q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._flush_lock:
+                self._write(self._drain(first, time.monotonic() + self.interval))
+
+    def flush(self):
+        """Synchronously write everything currently queued. Returns False if a write failed
+        (the rows stay queued for the writer thread to retry)."""
+        with self._flush_lock:
+            if self._failed and not self._write(self._failed):
+                return False
+            batch = []
+            while True:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+                if len(batch) >= self.batch_size:
+                    if not self._write(batch):
+                        return False
+                    batch = []
+            return self._write(batch) if batch else True
+
+    def close(self):
+        """Stop the writer thread and flush what is left (registered with atexit)."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if not self.flush():
+            with self._count_lock:
+                self.dropped += len(self._failed) + self._q.qsize()
+            print("Write-behind: unwritten rows dropped at exit")
+
+    def stats(self):
+        with self._count_lock:
+            return {"queued": self.queued, "flushed": self.flushed, "dropped": self.dropped,
+                    "pending": self._q.qsize() + len(self._failed), "flushes": self.flushes,
+                    "errors": self.errors, "retries": self.retries}